@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:28
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ec', '0010_remove_entry_systematic_name'),
+        ('uniprot', '0022_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', config='english'), name='ec_entry_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='ec_entry_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='synonym',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', config='english'), name='ec_synonym_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synonym',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='ec_synonym_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -2,9 +2,7 @@
 """Includes the models related with the EC classification"""
 
 # # python imports
-from Bio import SeqIO
-from collections import defaultdict
-import gzip
+from collections import defaultdict, Counter
 from urllib.request import urlretrieve
 from lxml import etree
 
@@ -16,6 +14,11 @@ from pseudoenzymes.settings import (EC_DAT_FILE, EC_CLASSES_FILE,
                                     PDB_UNIPROT_DAT_FILE
                                     )
 import uniprot.models as uniprot
+from pseudoenzymes import bulk, search
+from uniprot import dat
+
+ENTRY_SEARCH_VECTOR = search.search_vector("name", "description")
+SYNONYM_SEARCH_VECTOR = search.search_vector("name")
 
 
 # class ECQuerySet(models.QuerySet):
@@ -30,6 +33,13 @@ import uniprot.models as uniprot
         # return {ec.code: ec.id for ec in self}
 
 
+class EntryQuerySet(models.QuerySet):
+
+    def search(self, text):
+        """EC numbers with a name or description matching text, best matches first"""
+        return search.text_search(self, ENTRY_SEARCH_VECTOR, text, similar_field="name")
+
+
 class Entry(models.Model):
     """enzyme commission number"""
     number = models.TextField(primary_key=True)
@@ -46,6 +56,13 @@ class Entry(models.Model):
             )
 
     # objects = ECQuerySet.as_manager()
+    objects = EntryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            search.vector_index(ENTRY_SEARCH_VECTOR, "ec_entry_search_idx"),
+            search.trigram_index("name", "ec_entry_name_trgm_idx"),
+        ]
 
     def __str__(self):
         return str(self.number)
@@ -176,44 +193,63 @@ class EntryUniProtEntry(models.Model):
     def create_from_uniprot_dat_file(cls):
         """find and create all uniprot <-> ec pairs in the dat file
 
-        this file is more complete than the ec dat file from sibs"""
-        objs = []
-        entries = set(Entry.objects.all().values_list("number", flat=True))
-        uniprot_entries = set(uniprot.Entry.objects.all().values_list("ac", flat=True))
-        with gzip.open(UNIPROT_DAT_FILE, "rb") as dat_file:
-            for record in SeqIO.parse(dat_file, "swiss"):
-                for word in record.description.split():
-                    if word.startswith("EC="):
-                        number = word[3:].strip(";")
-                        if number not in entries:
-                            print(number)
-                        if record.id not in uniprot_entries:
-                            print(record.id)
-                        objs.append(cls(entry_id=number, uniprot_entry_id=record.id))
-        print(f"Creating {len(objs)} Uniprot<->EC associations")
-        cls.objects.bulk_create(objs, ignore_conflicts=True)
+        this file is more complete than the ec dat file from sibs. prefer adding an
+        EntryUniProtEntrySink to the sinks of uniprot.Entry.create_from_dat_file, which
+        avoids reading the file again"""
+        uniprot.Entry.create_from_dat_file(UNIPROT_DAT_FILE, sinks=[EntryUniProtEntrySink()],
+                                           checkpoint=False, diff=False)
 
     # @classmethod
     # def create_from_pdb_uniprot_dat_file(cls):
         # """find and create uniprot <-> ec pairs for sequences in pdb but not in swissprot
 
         # this file is more complete than the ec dat file from sibs"""
-        # objs = []
-        # entries = set(Entry.objects.all().values_list("number", flat=True))
-        # uniprot_entries = set(uniprot.Entry.objects.all().values_list("ac", flat=True))
-        # with gzip.open(PDB_UNIPROT_DAT_FILE, "rb") as dat_file:
-            # for record in SeqIO.parse(dat_file, "swiss"):
-                # print(record)
-                # for word in record.description.split():
-                    # if word.startswith("EC="):
-                        # number = word[3:].strip(";")
-                        # if number not in entries:
-                            # print(number)
-                        # if record.id not in uniprot_entries:
-                            # print(record.id)
-                        # objs.append(cls(entry_id=number, uniprot_entry_id=record.id))
-        # print(f"Creating {len(objs)} Uniprot<->EC associations")
-        # cls.objects.bulk_create(objs, ignore_conflicts=True)
+        # uniprot.Entry.create_from_dat_file(PDB_UNIPROT_DAT_FILE,
+                                           # sinks=[EntryUniProtEntrySink()],
+                                           # checkpoint=False, diff=False)
+
+
+class EntryUniProtEntrySink(dat.Sink):
+    """Creates uniprot <-> ec pairs from the EC= tokens in the descriptions of dat records"""
+
+    def __init__(self):
+        self.numbers = set(Entry.objects.all().values_list("number", flat=True))
+        self.unknown_numbers = Counter()
+
+    def write(self, records):
+        pairs = set()
+        for record in records:
+            for word in record.description.split():
+                if word.startswith("EC="):
+                    number = word[3:].strip(";")
+                    if number in self.numbers:
+                        pairs.add((number, record.accessions[0]))
+                    else:
+                        self.unknown_numbers[number] += 1
+        uniprot_entries = set(uniprot.Entry.objects.filter(ac__in={ac for _, ac in pairs})\
+                              .values_list("ac", flat=True))
+        created = bulk.copy_merge(
+                EntryUniProtEntry._meta.db_table,
+                ["entry_id", "uniprot_entry_id"],
+                [pair for pair in pairs if pair[1] in uniprot_entries]
+        )
+        print(f"Created {created} Uniprot<->EC associations")
+
+    def delete(self, acs):
+        EntryUniProtEntry.objects.filter(uniprot_entry_id__in=acs).delete()
+
+    def close(self):
+        if self.unknown_numbers:
+            print(f"Skipped {sum(self.unknown_numbers.values())} associations to "
+                  f"{len(self.unknown_numbers)} EC numbers not in the database: "
+                  f"{', '.join(sorted(self.unknown_numbers))}")
+
+
+class SynonymQuerySet(models.QuerySet):
+
+    def search(self, text):
+        """synonyms matching text, best matches first"""
+        return search.text_search(self, SYNONYM_SEARCH_VECTOR, text, similar_field="name")
 
 
 class Synonym(models.Model):
@@ -225,5 +261,11 @@ class Synonym(models.Model):
     )
     name = models.TextField()
 
+    objects = SynonymQuerySet.as_manager()
+
     class Meta:
         unique_together = ('entry', 'name')
+        indexes = [
+            search.vector_index(SYNONYM_SEARCH_VECTOR, "ec_synonym_search_idx"),
+            search.trigram_index("name", "ec_synonym_name_trgm_idx"),
+        ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# closure of the is_a relations already in the database, every term is its own ancestor
+# at depth 0 and depth is the length of the shortest chain. the depth limit guards against
+# cycles
+CREATE_CLOSURE = """
+WITH RECURSIVE chains (descendant_id, ancestor_id, depth) AS (
+    SELECT id, id, 0 FROM eco_term
+    UNION
+    SELECT c.descendant_id, r.term2_id, c.depth + 1
+    FROM chains c JOIN eco_relation r ON r.term1_id = c.ancestor_id AND r.relation = 'is_a'
+    WHERE c.depth < 255
+)
+INSERT INTO eco_closure (ancestor_id, descendant_id, depth, relation)
+SELECT ancestor_id, descendant_id, min(depth), 'is_a' FROM chains
+GROUP BY ancestor_id, descendant_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eco', '0003_relation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Closure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('relation', models.CharField(max_length=255)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_closures', to='eco.term')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_closures', to='eco.term')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'relation', 'ancestor'], name='eco_closure_descendant_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='closure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'relation', 'descendant'), name='unique_eco_closure'),
+        ),
+        migrations.RunSQL(CREATE_CLOSURE, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+
+def number_terms(apps, schema_editor):
+    """give every existing term a small integer, in id order"""
+    Term = apps.get_model("eco", "Term")
+    terms = list(Term.objects.order_by("id"))
+    for number, term in enumerate(terms, start=1):
+        term.number = number
+    Term.objects.bulk_update(terms, ["number"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eco', '0004_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='term',
+            name='number',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.RunPython(number_terms, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='term',
+            name='number',
+            field=models.SmallIntegerField(unique=True),
+        ),
+    ]
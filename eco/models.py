@@ -1,14 +1,22 @@
 # python imports
-import re
 from urllib.request import urlretrieve
 from collections import Counter
 
 # django imports
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Max
 
 # pseudoenzymes imports
+from pseudoenzymes import bulk, obo, ontology
 from pseudoenzymes.settings import ECO_ONTOLOGY_FILE
 
+# relation sets with a precomputed closure, see Closure and TermQuerySet.children_of
+CLOSURE_RELATIONS = [
+    "is_a",
+    ("is_a", "part_of"),
+]
+
+
 class TermQuerySet(models.QuerySet):
     """Some predefined querysets for the Eco Term model"""
 
@@ -16,24 +24,32 @@ class TermQuerySet(models.QuerySet):
         """return all experimental eco terms"""
         return self.children_of(Term.objects.filter(name="experimental evidence"))
 
-    def children_of(self, parents):
-        """recursively find all terms that are children of these parents
+    def children_of(self, parents, relations="is_a"):
+        """find all terms that are children of these parents, at any depth
+
+        children are related to parents through chains of any of these relation types.
+        parents are included in the resulting query. uses the Closure table, see
+        CLOSURE_RELATIONS for the relation sets that are precomputed
+        """
+        descendants = Closure.objects.of_relations(relations).filter(ancestor__in=parents)
+        return self.filter(id__in=descendants.values("descendant_id"))
+
+    def ancestors_of(self, children, relations="is_a"):
+        """find all terms that are ancestors of these children
 
-        parents are included in the resulting query
+        through chains of any of these relation types. children are included in the
+        resulting query. uses the Closure table
         """
-        ids = set(parents.values_list("id", flat=True))
-        no_previous_ids = 0
-        while no_previous_ids != len(ids):
-            no_previous_ids = len(ids)
-            ids.update(Term.objects.filter(relation1__term2__id__in=ids)\
-                       .values_list("id", flat=True))
-        return self.filter(id__in=ids)
+        ancestors = Closure.objects.of_relations(relations).filter(descendant__in=children)
+        return self.filter(id__in=ancestors.values("ancestor_id"))
 
 
 class Term(models.Model):
     """Evidence Ontology Terms"""
     # ids are not unique as integers. see 000156 for example
     id = models.CharField(primary_key=True, max_length=7)
+    # small surrogate key used by the (very large) tables that refer to eco terms
+    number = models.SmallIntegerField(unique=True)
     name = models.TextField(blank=False)
     definition = models.TextField()
 
@@ -60,22 +76,16 @@ class Term(models.Model):
     def create_from_ontology_file(cls):
         """Reads the ontology file and adds all the ECO terms to the database"""
         existing = set(cls.objects.values_list("id", flat=True))
-        inside_quotes = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+        number = (cls.objects.aggregate(Max("number"))["number__max"] or 0) + 1
         objs = []
-        info = {}
-        with open(ECO_ONTOLOGY_FILE, 'r') as obo_file:
-            for line in obo_file:
-                if line == "\n" and "id" in info:
-                    if info["id"] not in existing:
-                        objs.append(cls(**info))
-                    info = {}
-                elif line.startswith("id: ECO:"):
-                    info["id"] = line.strip().replace("id: ECO:", "")
-                elif line.startswith("def:"):
-                    info["definition"] = inside_quotes.findall(line)[0][1:-1]\
-                        .replace("\\\"", "\"").replace("\\n", "\n")
-                elif line.startswith("name:"):
-                    info["name"] = line.split(":", maxsplit=1)[1].strip()
+        for term in obo.Ontology.load(ECO_ONTOLOGY_FILE).terms.values():
+            if not term.id.startswith("ECO:"):
+                continue
+            eco_id = term.id.replace("ECO:", "")
+            if eco_id not in existing:
+                objs.append(cls(id=eco_id, number=number, name=term.name,
+                                definition=term.definition))
+                number += 1
         cls.objects.bulk_create(objs)
         print(f"Creating {len(objs)} ECO terms")
 
@@ -104,24 +114,88 @@ class Relation(models.Model):
         unique_together = ['term1', 'relation', 'term2']
 
     @classmethod
+    @transaction.atomic
     def create_from_ontology_file(cls):
-        """read the ontology file and add all the is_a ECO relations to the database"""
+        """read the ontology file and add all the ECO relations to the database
+
+        is_a and the relationship lines between ECO terms are read. the closures of
+        CLOSURE_RELATIONS are rebuilt at the end
+        """
         existing = set(cls.objects.values_list("term1", "relation", "term2"))
         objs = []
-        with open(ECO_ONTOLOGY_FILE, 'r') as obo_file:
-            term1 = None
-            for line in obo_file:
-                if line.startswith("[Term]"):
-                    term1 = "reading"
-                elif line.startswith("id: ECO") and term1 == "reading":
-                    term1 = line.replace("id: ECO:", "").strip()
-                elif line.startswith("is_a: ECO:") and term1 not in [None, "reading"]:
-                    term2 = line.replace("is_a: ECO:", "").split("!")[0].split("{")[0].strip()
-                    if (term1, "is_a", term2) not in existing:
-                        objs.append(cls(term1_id=term1, term2_id=term2, relation="is_a"))
-                elif line == "\n":
-                    term1 = None
+        for term1, relation, term2 in obo.Ontology.load(ECO_ONTOLOGY_FILE).relations("ECO:"):
+            term1 = term1.replace("ECO:", "")
+            term2 = term2.replace("ECO:", "")
+            if (term1, relation, term2) not in existing:
+                existing.add((term1, relation, term2))
+                objs.append(cls(term1_id=term1, term2_id=term2, relation=relation))
         cls.objects.bulk_create(objs)
         print(f"Creating {len(objs)} ECO terms relations")
+        for relations in CLOSURE_RELATIONS:
+            Closure.create_from_relations(relations)
+
+
+class ClosureQuerySet(models.QuerySet):
+
+    def of_relations(self, relations="is_a"):
+        """closure rows of this relation type or set of relation types
+
+        raises ValueError for sets not in CLOSURE_RELATIONS, which have no closure rows
+        """
+        return self.filter(relation=ontology.relation_key(relations, CLOSURE_RELATIONS))
 
 
+class Closure(models.Model):
+    """Transitive closure of the relations between ECO terms
+
+    descendant is related to ancestor through a chain of relations of the types in
+    relation (a set of types, see ontology.relation_key). every term is its own ancestor
+    at depth 0, depth is the length of the shortest chain. rebuilt by
+    Relation.create_from_ontology_file, which also refreshes the experimental flag of
+    the GO annotations
+    """
+    ancestor = models.ForeignKey(
+            "Term",
+            on_delete=models.CASCADE,
+            related_name="descendant_closures"
+            )
+    descendant = models.ForeignKey(
+            "Term",
+            on_delete=models.CASCADE,
+            related_name="ancestor_closures"
+            )
+    depth = models.PositiveSmallIntegerField()
+    relation = models.CharField(max_length=255)
+
+    objects = ClosureQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "relation", "descendant"],
+                                    name="unique_eco_closure"),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "relation", "ancestor"],
+                         name="eco_closure_descendant_idx"),
+        ]
+
+    @classmethod
+    @transaction.atomic
+    def create_from_relations(cls, relations="is_a"):
+        """rebuild the closure of the relations of this type or set of types"""
+        relation = ontology.relation_key(relations)
+        cls.objects.filter(relation=relation).delete()
+        # read before the COPY, no other query can run on the connection during it
+        edges = list(Relation.objects.filter(relation__in=relation.split("+"))
+                     .values_list("term1_id", "term2_id"))
+        terms = list(Term.objects.values_list("id", flat=True))
+        rows = ((ancestor, descendant, depth, relation)
+                for ancestor, descendant, depth in ontology.closure_rows(terms, edges))
+        created = bulk.copy_rows(cls._meta.db_table,
+                                 ["ancestor_id", "descendant_id", "depth", "relation"],
+                                 rows)
+        print(f"Creating {created} ECO {relation} closure rows")
+        if relation == "is_a":
+            # TermQuerySet.experimental reads the is_a closure
+            import go.models as go
+            go.TermUniProtEntry.refresh_experimental()
@@ -0,0 +1,224 @@
+"""Compact in-memory representation of the GO graph
+
+terms are referred to by their position in the sorted array of GO ids. direct relations
+are kept as CSR adjacency arrays (parents and children) and the transitive closure as a
+packed bit matrix, where bit j of row i is set when term j is an ancestor of term i (every
+term is its own ancestor). the matrix uses n_terms * n_terms / 8 bytes, so analyses that
+only need part of the ontology should load a subset, e.g. GoDag.load(Term.objects.functional()).
+the ancestors of a few terms are cheaper to read with go.Closure.objects.ancestors_by_term
+"""
+
+# python standard imports
+from pathlib import Path
+
+# library imports
+import numpy as np
+
+from pseudoenzymes.settings import GO_DAG_FILE
+
+# annotations propagated at once by GoDag.propagate, bounds the memory used
+PROPAGATION_CHUNK_SIZE = 100000
+
+
+def _csr(rows, cols, size):
+    """indptr and indices arrays of a CSR adjacency from (row, col) pairs"""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32)
+
+
+class GoDag:
+    """GO graph indexed by integer positions with a bitset of ancestors per term"""
+
+    def __init__(self, term_ids, descendants, ancestors, depths):
+        """term_ids are GO ids, the other arrays are the rows of the closure table"""
+        self.term_ids = np.unique(np.asarray(term_ids, dtype=np.int32))
+        size = len(self.term_ids)
+        known = np.isin(descendants, self.term_ids) & np.isin(ancestors, self.term_ids)
+        descendants = self.index(np.asarray(descendants)[known])
+        ancestors = self.index(np.asarray(ancestors)[known])
+        direct = np.asarray(depths)[known] == 1
+        self.parent_indptr, self.parent_indices = _csr(
+                descendants[direct], ancestors[direct], size)
+        self.child_indptr, self.child_indices = _csr(
+                ancestors[direct], descendants[direct], size)
+        self.ancestor_bits = np.zeros((size, (size + 7) // 8), dtype=np.uint8)
+        self.ancestor_bits[np.arange(size), np.arange(size) >> 3] |= \
+            (128 >> (np.arange(size) & 7)).astype(np.uint8)
+        np.bitwise_or.at(self.ancestor_bits, (descendants, ancestors >> 3),
+                         (128 >> (ancestors & 7)).astype(np.uint8))
+
+    def __len__(self):
+        return len(self.term_ids)
+
+    @classmethod
+    def from_database(cls, terms=None, relations="is_a"):
+        """build the dag from the go.Closure table, restricted to a queryset of terms
+
+        relations is a relation type or set of types with a precomputed closure
+        """
+        return cls(*cls._closure_arrays(terms, relations))
+
+    @classmethod
+    def load(cls, terms=None, filename=GO_DAG_FILE):
+        """build the dag from the cached is_a closure, creating the cache if needed
+
+        terms can be a queryset or an iterable of GO ids to restrict the dag to. the cache
+        is deleted when the closure is rebuilt
+        """
+        filename = Path(filename)
+        if not filename.exists():
+            cls.save_closure(filename)
+        arrays = np.load(filename)
+        term_ids = arrays["term_ids"]
+        if terms is not None:
+            if hasattr(terms, "values_list"):
+                terms = terms.values_list("id", flat=True)
+            term_ids = np.intersect1d(term_ids, np.fromiter(terms, dtype=np.int32))
+        return cls(term_ids, arrays["descendants"], arrays["ancestors"], arrays["depths"])
+
+    @classmethod
+    def save_closure(cls, filename=GO_DAG_FILE):
+        """cache the is_a closure table in a npz file, see GoDag.load"""
+        term_ids, descendants, ancestors, depths = cls._closure_arrays()
+        np.savez(filename, term_ids=term_ids, descendants=descendants, ancestors=ancestors,
+                 depths=depths)
+        print(f"Saved {len(descendants)} GO closure rows to {filename}")
+
+    @staticmethod
+    def _closure_arrays(terms=None, relations="is_a"):
+        """term ids and the descendant, ancestor and depth columns of the closure table"""
+        import go.models as go
+        closure = go.Closure.objects.of_relations(relations)
+        if terms is not None:
+            closure = closure.filter(descendant__in=terms, ancestor__in=terms)
+        else:
+            terms = go.Term.objects.all()
+        term_ids = np.fromiter(terms.values_list("id", flat=True), dtype=np.int32)
+        rows = np.array(list(closure.values_list("descendant_id", "ancestor_id", "depth")),
+                        dtype=np.int32).reshape(-1, 3)
+        return term_ids, rows[:, 0], rows[:, 1], rows[:, 2]
+
+    def index(self, term_ids):
+        """positions of these GO ids, raises KeyError for unknown ids"""
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        positions = np.searchsorted(self.term_ids, term_ids)
+        positions[positions == len(self.term_ids)] = 0
+        if not np.array_equal(self.term_ids[positions], term_ids):
+            missing = term_ids[self.term_ids[positions] != term_ids]
+            raise KeyError(f"GO ids not in the dag: {missing[:10].tolist()}")
+        return positions
+
+    def parents(self, term_id):
+        """GO ids of the direct parents of a term"""
+        position = self.index([term_id])[0]
+        start, end = self.parent_indptr[position], self.parent_indptr[position + 1]
+        return self.term_ids[self.parent_indices[start:end]]
+
+    def children(self, term_id):
+        """GO ids of the direct children of a term"""
+        position = self.index([term_id])[0]
+        start, end = self.child_indptr[position], self.child_indptr[position + 1]
+        return self.term_ids[self.child_indices[start:end]]
+
+    def ancestors(self, term_id, include_self=True):
+        """GO ids of all the ancestors of a term"""
+        position = self.index([term_id])[0]
+        bits = np.unpackbits(self.ancestor_bits[position], count=len(self)).astype(bool)
+        bits[position] = include_self
+        return self.term_ids[bits]
+
+    def descendants(self, term_id, include_self=True):
+        """GO ids of all the descendants of a term"""
+        position = self.index([term_id])[0]
+        bits = (self.ancestor_bits[:, position >> 3] & (128 >> (position & 7))) != 0
+        bits[position] = include_self
+        return self.term_ids[bits]
+
+    def is_ancestor(self, ancestor_ids, descendant_ids):
+        """element-wise test of whether the ancestors are ancestors of the descendants"""
+        ancestors = self.index(ancestor_ids)
+        descendants = self.index(descendant_ids)
+        return (self.ancestor_bits[descendants, ancestors >> 3] & (128 >> (ancestors & 7))) != 0
+
+    def propagate(self, groups, term_ids, number_of_groups=None):
+        """packed bitsets of the terms annotated to each group, and all their ancestors
+
+        groups are integer group (e.g. protein) indexes and term_ids the GO ids annotated to
+        them, one pair per annotation. returns a (number_of_groups, bytes per row) array
+        """
+        groups = np.asarray(groups, dtype=np.int64)
+        positions = self.index(term_ids)
+        if number_of_groups is None:
+            number_of_groups = int(groups.max()) + 1 if len(groups) else 0
+        order = np.argsort(groups, kind="stable")
+        groups, positions = groups[order], positions[order]
+        propagated = np.zeros((number_of_groups, self.ancestor_bits.shape[1]), dtype=np.uint8)
+        for start in range(0, len(groups), PROPAGATION_CHUNK_SIZE):
+            chunk_groups = groups[start:start + PROPAGATION_CHUNK_SIZE]
+            chunk_positions = positions[start:start + PROPAGATION_CHUNK_SIZE]
+            unique_groups, first = np.unique(chunk_groups, return_index=True)
+            propagated[unique_groups] |= np.bitwise_or.reduceat(
+                    self.ancestor_bits[chunk_positions], first, axis=0)
+        return propagated
+
+    def pack(self, groups, term_ids, number_of_groups=None):
+        """packed bitsets of the terms annotated to each group, without their ancestors
+
+        for annotations that are already propagated, e.g. go.PropagatedAnnotation
+        """
+        groups = np.asarray(groups, dtype=np.int64)
+        positions = self.index(term_ids)
+        if number_of_groups is None:
+            number_of_groups = int(groups.max()) + 1 if len(groups) else 0
+        bitsets = np.zeros((number_of_groups, self.ancestor_bits.shape[1]), dtype=np.uint8)
+        np.bitwise_or.at(bitsets, (groups, positions >> 3),
+                         (128 >> (positions & 7)).astype(np.uint8))
+        return bitsets
+
+    def union(self, bitsets, rows=None):
+        """single packed bitset with all the terms in these rows of bitsets"""
+        if rows is not None:
+            bitsets = bitsets[rows]
+        return np.bitwise_or.reduce(bitsets, axis=0) if len(bitsets) \
+            else np.zeros(self.ancestor_bits.shape[1], dtype=np.uint8)
+
+    def term_counts(self, bitsets):
+        """number of rows of a packed bitset array that include each term"""
+        counts = np.zeros(len(self), dtype=np.int64)
+        for start in range(0, len(bitsets), PROPAGATION_CHUNK_SIZE):
+            counts += np.unpackbits(bitsets[start:start + PROPAGATION_CHUNK_SIZE], axis=1,
+                                    count=len(self)).sum(axis=0, dtype=np.int64)
+        return counts
+
+    def unpack(self, bitset):
+        """GO ids in a packed bitset"""
+        return self.term_ids[np.unpackbits(bitset, count=len(self)).astype(bool)]
+
+    def walk(self, root, depth_limit=None, key=None):
+        """yield root and the GO ids below it in depth first order, each term once
+
+        children are visited in decreasing order of key, if given
+        """
+        def sorted_children(term_id):
+            children = [int(child) for child in self.children(term_id)]
+            if key is not None:
+                children.sort(key=key, reverse=True)
+            return iter(children)
+
+        seen = {root}
+        yield root
+        if depth_limit == 0:
+            return
+        stack = [(sorted_children(root), 1)]
+        while stack:
+            children, depth = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+            elif child not in seen:
+                seen.add(child)
+                yield child
+                if depth_limit is None or depth < depth_limit:
+                    stack.append((sorted_children(child), depth + 1))
@@ -0,0 +1,252 @@
+"""Helpers to stream GO annotation (gpa) files into COPY
+
+the functions used by the worker processes do not import the models
+"""
+
+# python standard imports
+from collections import Counter, defaultdict, deque
+import gzip
+import os
+from pathlib import Path
+import time
+from multiprocessing import Pool
+import zlib
+
+# pseudoenzymes imports
+from pseudoenzymes.bulk import copy_line
+
+# size of the blocks of the decompressed file sent to the workers
+GPA_CHUNK_SIZE = 16 * 1024 * 1024
+# seconds between progress reports
+REPORT_INTERVAL = 30
+# files the annotations are split into to compare two releases, see diff_copy_text
+DIFF_BUCKETS = 256
+# characters buffered by a BucketWriter before they are written to the bucket files
+BUCKET_BUFFER_SIZE = 4 * 1024 * 1024
+
+# columns of the COPY text produced by copy_text, in order
+COLUMNS = ["uniprot_entry_id", "qualifier_id", "term_id", "eco_term_id", "experimental"]
+
+# set in each worker by _init_worker
+_terms = None
+_eco_terms = None
+_qualifiers = None
+_resolver = None
+_experimental = None
+
+
+def read_chunks(filename, chunk_size=GPA_CHUNK_SIZE):
+    """yield blocks of complete lines of a gzip compressed gpa file
+
+    blocks end where the protein accession changes, so the annotations of a protein are
+    never split between blocks (gpa files are grouped by protein)
+    """
+    with gzip.open(filename, "rb") as gpa_file:
+        next_line = b""
+        while block := gpa_file.read(chunk_size):
+            # complete the last line and add the other annotations of its protein
+            lines = [next_line, block, gpa_file.readline()]
+            last_ac = _accession(b"".join(lines[-2:]).rstrip(b"\n").rsplit(b"\n", 1)[-1])
+            next_line = b""
+            while line := gpa_file.readline():
+                if _accession(line) != last_ac:
+                    next_line = line
+                    break
+                lines.append(line)
+            yield b"".join(lines)
+        if next_line:
+            yield next_line
+
+
+def _accession(line):
+    """protein accession of a gpa line"""
+    return line.split(b"\t", 2)[1] if b"\t" in line else None
+
+
+def _init_worker(terms, eco_terms, qualifiers, resolver, experimental):
+    global _terms, _eco_terms, _qualifiers, _resolver, _experimental
+    _terms = terms
+    _eco_terms = eco_terms
+    _qualifiers = qualifiers
+    _resolver = resolver
+    _experimental = experimental
+
+
+def copy_text(data):
+    """COPY text of the UniProt annotations in a block of gpa lines
+
+    qualifiers and eco terms are written as their integer ids, and alternative or obsolete
+    GO ids as the ids of the terms replacing them. the experimental column is true for
+    eco terms in _experimental. returns (text, number of rows, Counter
+    of skipped GO and ECO terms not in the database, Counter of resolved GO ids, set of the
+    rows with qualifiers not in _qualifiers, with the qualifier name instead of its id).
+    duplicated annotations in the block are written once
+    """
+    rows = set()
+    unknown_qualifiers = set()
+    skipped = Counter()
+    resolved = Counter()
+    for line in data.decode("utf-8").splitlines():
+        if not line.startswith("UniProtKB"):
+            continue
+        words = line.split("\t")
+        term = int(words[3].split(":")[1])
+        eco_term = words[5].split(":")[1].strip()
+        if term in _resolver:
+            resolved[term] += 1
+            term = _resolver[term]
+        if term not in _terms:
+            skipped[f"GO:{term:07}"] += 1
+            continue
+        if eco_term not in _eco_terms:
+            skipped[f"ECO:{eco_term}"] += 1
+            continue
+        eco_number = _eco_terms[eco_term]
+        row = (words[1], words[2], term, eco_number, eco_number in _experimental)
+        if words[2] not in _qualifiers:
+            unknown_qualifiers.add(row)
+            continue
+        rows.add((words[1], _qualifiers[words[2]], *row[2:]))
+    return "".join(copy_line(row) for row in rows), len(rows), skipped, resolved, \
+        unknown_qualifiers
+
+
+def stream_copy_text(filename, terms, eco_terms, qualifiers, resolver=None, experimental=None,
+                     processes=None, create_qualifier=None):
+    """yield the COPY text of all the UniProt annotations of a gpa file
+
+    terms is a set of GO ids, eco_terms and qualifiers are dicts of names to their ids,
+    resolver a dict of alternative and obsolete GO ids to their primary ids and experimental
+    the set of eco term ids (numbers) of experimental evidence. qualifiers not in
+    qualifiers are passed to create_qualifier, which returns their new id, and the
+    annotations with them are skipped if it is None
+
+    blocks are parsed by a pool of processes while the file is decompressed, and only a
+    couple of blocks per process are kept ahead of the consumer, so memory use stays
+    bounded whatever the size of the file
+    """
+    processes = processes or os.cpu_count()
+    qualifiers = dict(qualifiers)
+    rows = 0
+    skipped = Counter()
+    resolved = Counter()
+    start = last_report = time.perf_counter()
+    initargs = (terms, eco_terms, qualifiers, resolver or {}, experimental or set())
+    with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        pending = deque()
+        chunks = read_chunks(filename)
+        while True:
+            while len(pending) < 2 * processes:
+                data = next(chunks, None)
+                if data is None:
+                    break
+                pending.append(pool.apply_async(copy_text, (data, )))
+            if not pending:
+                break
+            text, chunk_rows, chunk_skipped, chunk_resolved, unknown = pending.popleft().get()
+            for row in unknown:
+                if row[1] not in qualifiers:
+                    if create_qualifier is None:
+                        chunk_skipped[row[1]] += 1
+                        continue
+                    qualifiers[row[1]] = create_qualifier(row[1])
+                    print(f"Created the qualifier {row[1]}")
+                text += copy_line((row[0], qualifiers[row[1]], *row[2:]))
+                chunk_rows += 1
+            rows += chunk_rows
+            skipped.update(chunk_skipped)
+            resolved.update(chunk_resolved)
+            yield text
+            if time.perf_counter() - last_report > REPORT_INTERVAL:
+                last_report = time.perf_counter()
+                print(f"{rows} annotations, {rows / (last_report - start):.0f} rows/s")
+    elapsed = time.perf_counter() - start
+    print(f"Read {rows} annotations in {elapsed:.0f} s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+    if resolved:
+        print(f"Resolved {sum(resolved.values())} annotations to {len(resolved)} alternative "
+              f"or obsolete GO ids")
+    if skipped:
+        print(f"Skipped {sum(skipped.values())} annotations to {len(skipped)} terms or "
+              f"qualifiers not in the database: {', '.join(sorted(skipped)[:20])}")
+
+
+class BucketWriter:
+    """write only file object that splits COPY text lines into bucket files
+
+    lines are assigned to buckets by a hash of the protein accession (first column), so the
+    same annotation always goes to the same bucket. it can be passed to COPY ... TO STDOUT
+    """
+
+    def __init__(self, directory, prefix, buckets=DIFF_BUCKETS):
+        self.filenames = [Path(directory) / f"{prefix}_{bucket}.txt" for bucket in range(buckets)]
+        self._files = [open(filename, "w") for filename in self.filenames]
+        self._buffer = []
+        self._size = 0
+        self._rest = ""
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        self._buffer.append(data)
+        self._size += len(data)
+        if self._size > BUCKET_BUFFER_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        lines = (self._rest + "".join(self._buffer)).split("\n")
+        self._rest = lines.pop()
+        self._buffer = []
+        self._size = 0
+        buckets = defaultdict(list)
+        for line in lines:
+            accession = line.split("\t", 1)[0]
+            buckets[zlib.crc32(accession.encode()) % len(self._files)].append(line + "\n")
+        for bucket, bucket_lines in buckets.items():
+            self._files[bucket].writelines(bucket_lines)
+
+    def close(self):
+        self.flush()
+        for bucket_file in self._files:
+            bucket_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def diff_copy_text(old_filenames, new_filenames, accession_filenames=None):
+    """yield, bucket by bucket, the lines only in the new or only in the old bucket files
+
+    old and new bucket files must have been written by BucketWriters with the same number of
+    buckets. only one pair of buckets is in memory at a time. each COPY text line gets an
+    extra column that is t for lines to delete (only in old) and f for lines to insert.
+    with accession_filenames (bucket files of the accessions in the database, one per line)
+    lines of other accessions are left out
+    """
+    inserted = deleted = skipped = 0
+    accession_filenames = accession_filenames or [None] * len(old_filenames)
+    for old_filename, new_filename, accession_filename in zip(old_filenames, new_filenames,
+                                                              accession_filenames):
+        with open(old_filename) as old_file:
+            old = set(old_file)
+        with open(new_filename) as new_file:
+            new = set(new_file)
+        to_insert = new - old
+        to_delete = old - new
+        if accession_filename is not None:
+            with open(accession_filename) as accession_file:
+                accessions = {line.rstrip("\n") for line in accession_file}
+            changes = len(to_insert) + len(to_delete)
+            to_insert = {line for line in to_insert if line.split("\t", 1)[0] in accessions}
+            to_delete = {line for line in to_delete if line.split("\t", 1)[0] in accessions}
+            skipped += changes - len(to_insert) - len(to_delete)
+        inserted += len(to_insert)
+        deleted += len(to_delete)
+        yield "".join(f"{line[:-1]}\tf\n" for line in to_insert) \
+            + "".join(f"{line[:-1]}\tt\n" for line in to_delete)
+    print(f"Found {inserted} new and {deleted} removed annotations")
+    if skipped:
+        print(f"Skipped {skipped} changed annotations of UniProt entries not in the database")
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:28
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('go', '0049_alter_term_aspect'),
+        ('uniprot', '0022_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='term',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'definition', config='english'), name='go_term_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='term',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='go_term_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,72 @@
+"""Hash partition go_termuniprotentry by uniprot_entry_id
+
+the model does not change, only the table: data, indexes and constraints are copied to a
+partitioned table. primary keys of partitioned tables must include the partition key, so the
+primary key becomes (id, uniprot_entry_id)
+"""
+
+from django.db import migrations
+
+TABLE = "go_termuniprotentry"
+PARTITIONS = 16
+
+
+def rebuild_table(cursor, partitioned):
+    """copy the table into a new (partitioned or plain) table with the same indexes"""
+    cursor.execute("""SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+                      WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f', 'c')
+                      ORDER BY contype DESC;""", [TABLE])
+    constraints = cursor.fetchall()
+    cursor.execute("""SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s
+                      AND indexname NOT IN (SELECT conname FROM pg_constraint
+                                            WHERE conrelid = %s::regclass);""", [TABLE, TABLE])
+    indexes = cursor.fetchall()
+
+    new_table = f"{TABLE}_new"
+    if partitioned:
+        cursor.execute(f"CREATE TABLE {new_table} (LIKE {TABLE}) "
+                       f"PARTITION BY HASH (uniprot_entry_id);")
+        for remainder in range(PARTITIONS):
+            cursor.execute(f"CREATE TABLE {TABLE}_p{remainder} PARTITION OF {new_table} "
+                           f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder});")
+    else:
+        cursor.execute(f"CREATE TABLE {new_table} (LIKE {TABLE});")
+    cursor.execute(f"INSERT INTO {new_table} SELECT * FROM {TABLE};")
+    cursor.execute(f"DROP TABLE {TABLE};")
+    cursor.execute(f"ALTER TABLE {new_table} RENAME TO {TABLE};")
+
+    # the id sequence was owned by the old table
+    cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id;")
+    cursor.execute(f"SELECT setval('{TABLE}_id_seq', coalesce(max(id), 0) + 1, false) "
+                   f"FROM {TABLE};")
+    cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq');")
+
+    for name, command in indexes:
+        cursor.execute(command)
+    for name, definition in constraints:
+        if partitioned:
+            definition = definition.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, uniprot_entry_id)")
+        else:
+            definition = definition.replace("PRIMARY KEY (id, uniprot_entry_id)", "PRIMARY KEY (id)")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition};")
+
+
+def partition(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('go', '0051_closure'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eco', '0005_term_number'),
+        ('go', '0052_partition_termuniprotentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Qualifier',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=127, unique=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='termuniprotentry',
+            unique_together=set(),
+        ),
+        migrations.RemoveIndex(
+            model_name='termuniprotentry',
+            name='go_termunip_uniprot_3c4e0d_idx',
+        ),
+        migrations.RenameField(
+            model_name='termuniprotentry',
+            old_name='qualifier',
+            new_name='qualifier_name',
+        ),
+        migrations.RenameField(
+            model_name='termuniprotentry',
+            old_name='eco_term',
+            new_name='eco_term_code',
+        ),
+        # the old columns are nullable while they are removed, so that when unapplying they
+        # are added back empty, filled by the reverse UPDATE and only then made NOT NULL
+        migrations.AlterField(
+            model_name='termuniprotentry',
+            name='qualifier_name',
+            field=models.CharField(db_index=True, max_length=127, null=True),
+        ),
+        migrations.AlterField(
+            model_name='termuniprotentry',
+            name='eco_term_code',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='eco.term'),
+        ),
+        migrations.AddField(
+            model_name='termuniprotentry',
+            name='qualifier',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='go.qualifier'),
+        ),
+        migrations.AddField(
+            model_name='termuniprotentry',
+            name='eco_term',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='eco.term', to_field='number'),
+        ),
+        # the new foreign keys are deferred, they must be checked before altering the table again
+        migrations.RunSQL(
+            sql=["SET CONSTRAINTS ALL IMMEDIATE;",
+                 """INSERT INTO go_qualifier (name)
+                    SELECT DISTINCT qualifier_name FROM go_termuniprotentry;""",
+                 """UPDATE go_termuniprotentry t SET qualifier_id = q.id, eco_term_id = e.number
+                    FROM go_qualifier q, eco_term e
+                    WHERE q.name = t.qualifier_name AND e.id = t.eco_term_code_id;"""],
+            reverse_sql=["SET CONSTRAINTS ALL IMMEDIATE;",
+                         """UPDATE go_termuniprotentry t SET qualifier_name = q.name,
+                                   eco_term_code_id = e.id
+                            FROM go_qualifier q, eco_term e
+                            WHERE q.id = t.qualifier_id AND e.number = t.eco_term_id;"""],
+        ),
+        migrations.RemoveField(
+            model_name='termuniprotentry',
+            name='qualifier_name',
+        ),
+        migrations.RemoveField(
+            model_name='termuniprotentry',
+            name='eco_term_code',
+        ),
+        migrations.AlterField(
+            model_name='termuniprotentry',
+            name='qualifier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='go.qualifier'),
+        ),
+        migrations.AlterField(
+            model_name='termuniprotentry',
+            name='eco_term',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='eco.term', to_field='number'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='termuniprotentry',
+            unique_together={('term', 'uniprot_entry', 'qualifier', 'eco_term')},
+        ),
+        migrations.AddIndex(
+            model_name='termuniprotentry',
+            index=models.Index(fields=['uniprot_entry_id', 'term_id', 'qualifier', 'eco_term_id'], name='go_termunip_uniprot_f133ea_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('go', '0053_qualifier_and_more'),
+        ('uniprot', '0023_annotationflags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropagatedAnnotation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direct', models.BooleanField()),
+                ('qualifier', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='go.qualifier')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='propagated_uniprot_annotations', to='go.term')),
+                ('uniprot_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='propagated_go_annotations', to='uniprot.entry')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'qualifier', 'uniprot_entry'], name='go_propagated_term_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='propagatedannotation',
+            constraint=models.UniqueConstraint(fields=('uniprot_entry', 'qualifier', 'term'), name='unique_go_propagated'),
+        ),
+        migrations.RunSQL(
+            sql="""INSERT INTO go_propagatedannotation (uniprot_entry_id, qualifier_id, term_id, direct)
+                     SELECT a.uniprot_entry_id, a.qualifier_id, c.ancestor_id, bool_or(c.depth = 0)
+                     FROM go_termuniprotentry a
+                     JOIN go_closure c ON c.descendant_id = a.term_id AND c.relation = 'is_a'
+                     JOIN go_qualifier q ON q.id = a.qualifier_id
+                     WHERE q.name NOT LIKE 'NOT|%'
+                     GROUP BY 1, 2, 3;""",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eco', '0005_term_number'),
+        ('go', '0054_propagatedannotation'),
+        ('uniprot', '0023_annotationflags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termuniprotentry',
+            name='experimental',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunSQL(
+            sql="""UPDATE go_termuniprotentry SET experimental = true
+                     WHERE eco_term_id IN (
+                         SELECT e.number FROM eco_term e
+                         JOIN eco_closure c ON c.descendant_id = e.id AND c.relation = 'is_a'
+                         JOIN eco_term a ON a.id = c.ancestor_id
+                         WHERE a.name = 'experimental evidence');""",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='termuniprotentry',
+            index=models.Index(condition=models.Q(('experimental', True)), fields=['uniprot_entry', 'term'], name='go_tue_exp_entry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='termuniprotentry',
+            index=models.Index(condition=models.Q(('experimental', True)), fields=['term', 'uniprot_entry'], name='go_tue_exp_term_idx'),
+        ),
+    ]
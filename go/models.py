@@ -2,19 +2,33 @@
 """Contains models related with GO Terms"""
 
 # python standard imports
-import gzip
+import os
 import re
+import tempfile
 from urllib.request import urlretrieve
-import csv
-import subprocess
-import os
 
 # django imports
-from django.db import models, transaction, connection
+from django.db import models, transaction, connection, connections
+from django.db.models import Q
 
-from pseudoenzymes.settings import GENE_ONTOLOGY_FILE, GO_GPA_FILE, GO_GPA_CSV
+from pseudoenzymes.settings import GENE_ONTOLOGY_FILE, GO_GPA_FILE, GO_DAG_FILE, GO_GPA_DIFF_FOLDER
+from pseudoenzymes import bulk, obo, ontology, search
 import uniprot.models as uniprot
 import eco.models as eco
+from go import gpa
+
+TERM_SEARCH_VECTOR = search.search_vector("name", "definition")
+# relation sets with a precomputed closure, see Closure and TermQuerySet.children_of
+CLOSURE_RELATIONS = [
+    "is_a",
+    ("is_a", "part_of"),
+    ("is_a", "part_of", "regulates", "positively_regulates", "negatively_regulates"),
+]
+
+# GO ids per query of ClosureQuerySet.ancestors_by_term
+ANCESTORS_QUERY_BATCH_SIZE = 5000
+
+INDEX_DEFINITION = re.compile(r"^CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (USING .*)$")
 
 
 class TermQuerySet(models.QuerySet):
@@ -28,18 +42,28 @@ class TermQuerySet(models.QuerySet):
         """go terms related with the function of the protein"""
         return self.children_of(Term.objects.filter(name="molecular_function"))
 
-    def children_of(self, parents):
-        """recursively find all terms that are children of these parents
+    def children_of(self, parents, relations="is_a"):
+        """find all terms that are children of these parents, at any depth
 
-        parents are included in the resulting query
+        children are related to parents through chains of any of these relation types.
+        parents are included in the resulting query. uses the Closure table, see
+        CLOSURE_RELATIONS for the relation sets that are precomputed
         """
-        ids = set(parents.values_list("id", flat=True))
-        no_previous_ids = 0
-        while no_previous_ids != len(ids):
-            no_previous_ids = len(ids)
-            ids.update(Term.objects.filter(relation1__term2__id__in=ids)\
-                       .values_list("id", flat=True))
-        return self.filter(id__in=ids)
+        descendants = Closure.objects.of_relations(relations).filter(ancestor__in=parents)
+        return self.filter(id__in=descendants.values("descendant_id"))
+
+    def ancestors_of(self, children, relations="is_a"):
+        """find all terms that are ancestors of these children
+
+        through chains of any of these relation types. children are included in the
+        resulting query. uses the Closure table
+        """
+        ancestors = Closure.objects.of_relations(relations).filter(descendant__in=children)
+        return self.filter(id__in=ancestors.values("ancestor_id"))
+
+    def search(self, text):
+        """terms with a name or definition matching text, best matches first"""
+        return search.text_search(self, TERM_SEARCH_VECTOR, text, similar_field="name")
 
     def go_graph(self):
         """return graph representing the relationships among go terms"""
@@ -50,14 +74,8 @@ class TermQuerySet(models.QuerySet):
         return graph
 
     def go_to_ancestors(self):
-        """return dict of go terms pointing to ancestors"""
-        import networkx as nx
-        term_to_ancestors = {}
-        graph = self.go_graph()
-        for term in self:
-            if term.id in graph:
-                term_to_ancestors[term.id] = nx.ancestors(graph, term.id)
-        return term_to_ancestors
+        """return dict of go terms pointing to ancestors, read from the closure table"""
+        return Closure.objects.ancestors_by_term(self.values_list("id", flat=True))
 
 
 class Term(models.Model):
@@ -75,6 +93,12 @@ class Term(models.Model):
 
     objects = TermQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            search.vector_index(TERM_SEARCH_VECTOR, "go_term_search_idx"),
+            search.trigram_index("name", "go_term_name_trgm_idx"),
+        ]
+
     def __repr__(self):
         return self.code
 
@@ -94,28 +118,41 @@ class Term(models.Model):
     @classmethod
     def create_from_ontology_file(cls):
         """Reads the ontology file and adds all GO terms to the database"""
-        inside_quotes = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
         existing = set(cls.objects.values_list("id", flat=True))
         objs = []
-        with open(GENE_ONTOLOGY_FILE, 'r') as obo_file:
-            info = {}
-            for line in obo_file:
-                if line == "\n" and "id" in info:
-                    if info["id"] not in existing:
-                        objs.append(cls(**info))
-                    info = {}
-                elif line.startswith("id: GO:"):
-                    info["id"] = int(line.replace("id: GO:", ""))
-                elif line.startswith("def:"):
-                    info["definition"] = inside_quotes.findall(line)[0][1:-1]\
-                        .replace("\\\"", "\"").replace("\\n", "\n")
-                elif line.startswith("namespace"):
-                    info["aspect"] = line.split()[1]
-                elif line.startswith("name:"):
-                    info["name"] = line.split(":", maxsplit=1)[1].strip()
+        for term in obo.Ontology.load(GENE_ONTOLOGY_FILE).terms.values():
+            if not term.id.startswith("GO:"):
+                continue
+            go_id = int(term.id.replace("GO:", ""))
+            if go_id not in existing:
+                objs.append(cls(id=go_id, name=term.name, definition=term.definition,
+                                aspect=term.namespace))
         cls.objects.bulk_create(objs)
         print(f"Creating {len(objs)} Go Terms")
-        # cls.objects.catalytic_filter().update(is_catalytic=True)
+
+    @classmethod
+    def id_resolver(cls):
+        """dict of alternative and obsolete GO ids to the ids of the terms replacing them
+
+        alt_ids point to their primary term and obsolete terms to their replaced_by term,
+        following chains of replacements. only replacements in the database are included
+        """
+        ontology = obo.Ontology.load(GENE_ONTOLOGY_FILE)
+        replacements = ontology.alt_ids() | ontology.replacements()
+        existing = set(cls.objects.values_list("id", flat=True))
+        resolver = {}
+        for old in replacements:
+            new = old
+            seen = {old}
+            while new in replacements and replacements[new] not in seen:
+                new = replacements[new]
+                seen.add(new)
+            if not (old.startswith("GO:") and new.startswith("GO:")):
+                continue
+            new_id = int(new.replace("GO:", ""))
+            if new_id in existing:
+                resolver[int(old.replace("GO:", ""))] = new_id
+        return resolver
 
 
 class Relation(models.Model):
@@ -148,33 +185,152 @@ class Relation(models.Model):
     @classmethod
     @transaction.atomic
     def create_from_ontology_file(cls):
-        """Read the ontology file and add all the is_a GO relations to the database"""
+        """Read the ontology file and add all the GO relations to the database
+
+        is_a and the relationship lines (part_of, regulates, has_part, ...) between GO terms
+        are read. the closures of CLOSURE_RELATIONS are rebuilt at the end
+        """
         # TODO remove old relations
         existing = set(cls.objects.values_list("term1", "relation", "term2"))
         objs = []
-        with open(GENE_ONTOLOGY_FILE, 'r') as obo_file:
-            term1 = None
-            for line in obo_file:
-                if line.startswith("[Term]"):
-                    term1 = "reading"
-                elif line.startswith("id:") and term1 == "reading":
-                    term1 = int(line.replace("id: GO:", ""))
-                elif line.startswith("is_a") and term1:
-                    term2 = int(line.replace("is_a: GO:", "").split("!")[0])
-                    if (term1, "is_a", term2) not in existing:
-                        objs.append(cls(term1_id=term1,term2_id=term2, relation="is_a"))
-                elif line == "\n":
-                    term1 = None
+        for term1, relation, term2 in obo.Ontology.load(GENE_ONTOLOGY_FILE).relations("GO:"):
+            term1 = int(term1.replace("GO:", ""))
+            term2 = int(term2.replace("GO:", ""))
+            if (term1, relation, term2) not in existing:
+                existing.add((term1, relation, term2))
+                objs.append(cls(term1_id=term1, term2_id=term2, relation=relation))
         cls.objects.bulk_create(objs)
         print(f"Creating {len(objs)} go term relations")
+        for relations in CLOSURE_RELATIONS:
+            Closure.create_from_relations(relations)
+
+
+class ClosureQuerySet(models.QuerySet):
+
+    def of_relations(self, relations="is_a"):
+        """closure rows of this relation type or set of relation types
+
+        raises ValueError for sets not in CLOSURE_RELATIONS, which have no closure rows
+        """
+        return self.filter(relation=ontology.relation_key(relations, CLOSURE_RELATIONS))
+
+    def ancestors_by_term(self, term_ids, relations="is_a", include_self=False):
+        """dict of these GO ids to the sets of GO ids of their ancestors
+
+        indexed queries on the closure table, one per ANCESTORS_QUERY_BATCH_SIZE terms.
+        much cheaper than loading the whole go.dag.GoDag unless most of the ontology is
+        needed
+        """
+        term_ids = list(term_ids)
+        closure = self.of_relations(relations)
+        if not include_self:
+            closure = closure.filter(depth__gt=0)
+        ancestors = {term_id: set() for term_id in term_ids}
+        for start in range(0, len(term_ids), ANCESTORS_QUERY_BATCH_SIZE):
+            batch = term_ids[start:start + ANCESTORS_QUERY_BATCH_SIZE]
+            for descendant, ancestor in closure.filter(descendant_id__in=batch)\
+                    .values_list("descendant_id", "ancestor_id"):
+                ancestors[descendant].add(ancestor)
+        return ancestors
+
+
+class Closure(models.Model):
+    """Transitive closure of the relations between GO terms
+
+    descendant is related to ancestor through a chain of relations of the types in
+    relation (a set of types, see ontology.relation_key). every term is its own ancestor
+    at depth 0, depth is the length of the shortest chain. rebuilt by
+    Relation.create_from_ontology_file, PropagatedAnnotation must then be refreshed
+    """
+    ancestor = models.ForeignKey(
+            "Term",
+            on_delete=models.CASCADE,
+            related_name="descendant_closures"
+            )
+    descendant = models.ForeignKey(
+            "Term",
+            on_delete=models.CASCADE,
+            related_name="ancestor_closures"
+            )
+    depth = models.PositiveSmallIntegerField()
+    relation = models.CharField(max_length=255)
+
+    objects = ClosureQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "relation", "descendant"],
+                                    name="unique_go_closure"),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "relation", "ancestor"],
+                         name="go_closure_descendant_idx"),
+        ]
+
+    @classmethod
+    @transaction.atomic
+    def create_from_relations(cls, relations="is_a"):
+        """rebuild the closure of the relations of this type or set of types"""
+        relation = ontology.relation_key(relations)
+        cls.objects.filter(relation=relation).delete()
+        # read before the COPY, no other query can run on the connection during it
+        edges = list(Relation.objects.filter(relation__in=relation.split("+"))
+                     .values_list("term1_id", "term2_id"))
+        terms = list(Term.objects.values_list("id", flat=True))
+        rows = ((ancestor, descendant, depth, relation)
+                for ancestor, descendant, depth in ontology.closure_rows(terms, edges))
+        created = bulk.copy_rows(cls._meta.db_table,
+                                 ["ancestor_id", "descendant_id", "depth", "relation"],
+                                 rows)
+        print(f"Creating {created} GO {relation} closure rows")
+        # cached by go.dag.GoDag.load
+        GO_DAG_FILE.unlink(missing_ok=True)
+
+
+def _partition_object_name(name, partition):
+    """name of the index or constraint of a partition, short enough for postgres"""
+    return f"{name[:50]}_{partition.rsplit('_', 1)[-1]}"
+
+
+class Qualifier(models.Model):
+    """Qualifier (relation) of GO annotations, e.g. enables or NOT|enables"""
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=127, unique=True)
+
+    # relations in the qualifier column of GPA 1.1 files, all can be negated with NOT|.
+    # other qualifiers found in the files are added when they are loaded
+    RELATIONS = ["enables", "contributes_to", "involved_in", "acts_upstream_of",
+                 "acts_upstream_of_positive_effect", "acts_upstream_of_negative_effect",
+                 "acts_upstream_of_or_within", "acts_upstream_of_or_within_positive_effect",
+                 "acts_upstream_of_or_within_negative_effect", "located_in", "part_of",
+                 "is_active_in", "colocalizes_with"]
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def create_defaults(cls):
+        """create the qualifiers of the gpa format, returns a dict of name to id"""
+        names = cls.RELATIONS + [f"NOT|{relation}" for relation in cls.RELATIONS]
+        cls.objects.bulk_create([cls(name=name) for name in names], ignore_conflicts=True)
+        return dict(cls.objects.values_list("name", "id"))
+
+    @classmethod
+    def id_of(cls, name):
+        """id of the qualifier with this name, creating it if needed"""
+        return cls.objects.get_or_create(name=name)[0].id
 
 
 class TermUniProtEntryQuerySet(models.QuerySet):
     """Some predefined querysets for the GoTerm model"""
 
+    def with_qualifier(self, *names):
+        """associations with any of these qualifiers, filtered by their small integer id"""
+        return self.filter(qualifier__in=Qualifier.objects.filter(name__in=names))
+
     def catalytic(self):
         """return all catalytic go uniprot associations"""
-        return self.filter(term__in=Term.objects.catalytic(), qualifier="enables")
+        return self.filter(term__in=Term.objects.catalytic()).with_qualifier("enables")
 
     def not_catalytic(self):
         """return associations with proof of non catalytic activity for a given reaction
@@ -182,7 +338,7 @@ class TermUniProtEntryQuerySet(models.QuerySet):
         the protein might have other catalytic activities
         this does not include proteins that were not tested to be catalytic
         """
-        return self.filter(term__in=Term.objects.catalytic(), qualifier="NOT|enables")
+        return self.filter(term__in=Term.objects.catalytic()).with_qualifier("NOT|enables")
 
     def functional(self):
         """associations related with the function of the protein"""
@@ -190,10 +346,14 @@ class TermUniProtEntryQuerySet(models.QuerySet):
 
     def experimental(self):
         """return all experimentally supported associations"""
-        return self.filter(eco_term__in=eco.Term.objects.experimental())
+        return self.filter(experimental=True)
 
 class TermUniProtEntry(models.Model):
-    """Through table to link go with UniProt entries"""
+    """Through table to link go with UniProt entries
+
+    the table is hash partitioned by uniprot_entry_id (see migration 0052), so lookups by
+    UniProt entry only read one partition
+    """
     term = models.ForeignKey(
             "Term",
             on_delete=models.CASCADE,
@@ -202,8 +362,12 @@ class TermUniProtEntry(models.Model):
             "uniprot.Entry",
             on_delete=models.CASCADE,
             related_name="go_associations")
-    eco_term = models.ForeignKey("eco.Term", on_delete=models.CASCADE)
-    qualifier = models.CharField(max_length=127, db_index=True)
+    # qualifiers and eco terms are stored as small integers, the table has a row for every
+    # annotation in UniProt
+    eco_term = models.ForeignKey("eco.Term", to_field="number", on_delete=models.CASCADE)
+    qualifier = models.ForeignKey("Qualifier", on_delete=models.PROTECT)
+    # the eco term is experimental evidence, set when loading (see refresh_experimental)
+    experimental = models.BooleanField(default=False)
 
     objects = TermUniProtEntryQuerySet.as_manager()
 
@@ -212,121 +376,270 @@ class TermUniProtEntry(models.Model):
         indexes = [
             models.Index(fields=['uniprot_entry_id', 'term_id', 'qualifier', 'eco_term_id']),
             models.Index(fields=['uniprot_entry_id']),
+            models.Index(fields=["uniprot_entry", "term"], condition=Q(experimental=True),
+                         name="go_tue_exp_entry_idx"),
+            models.Index(fields=["term", "uniprot_entry"], condition=Q(experimental=True),
+                         name="go_tue_exp_term_idx"),
         ]
 
     @classmethod
-    def prepare_csv_file_for_ingestion(cls):
-        terms = set(Term.objects.values_list("id", flat=True))
-
-        with gzip.open(GO_GPA_FILE, "rt") as gpa, open(GO_GPA_CSV, "w", newline='') as dump:
-            writer = csv.writer(dump)
-            writer.writerow(["term_id", "uniprot_entry_id", "qualifier", "eco_term_id"])
-
-            for line in gpa:
-                if line.startswith("UniProtKB"):
-                    words = line.split()
-                    uniprot_id = words[1]
-                    qualifier = words[2]
-                    term = int(words[3].split(":")[1])
-                    if term not in terms:
-                        print("(skipping) term not found", term, line)
-                        # if just a couple of missing terms, is probably a new annotation
-                        continue
-                    eco_term = words[5].split(":")[1].strip()
-                    writer.writerow([term, uniprot_id, qualifier, eco_term])
+    def partitions(cls):
+        """names of the hash partitions of the table, empty if it is not partitioned"""
+        with connection.cursor() as cursor:
+            cursor.execute("""SELECT c.relname FROM pg_inherits i
+                              JOIN pg_class c ON c.oid = i.inhrelid
+                              WHERE i.inhparent = %s::regclass ORDER BY c.relname;""",
+                           [cls._meta.db_table])
+            return [row[0] for row in cursor.fetchall()]
 
     @classmethod
-    @transaction.atomic
-    def ingest_csv_file(cls):
-        # this function takes  hours to run
-        # drop constraints to make import faster
-        constraints = []
-        with connection.cursor() as cursor:
-            # cursor.execute("""SELECT conname, pg_get_constraintdef(oid)
-                              # FROM pg_constraint WHERE conrelid = 'go_termuniprotentry'::regclass
-                              # AND contype = 'f';""")
-            cursor.execute("""SELECT conname, pg_get_constraintdef(oid)
-                              FROM pg_constraint WHERE conrelid = 'go_termuniprotentry'::regclass
-                              ;""")
-            constraints = cursor.fetchall()
-            for constraint in constraints:
-                print(f"droping constraint {constraint[0]}")
-                cursor.execute(f"ALTER TABLE go_termuniprotentry DROP CONSTRAINT {constraint[0]};")
-
-        # drop indexes
-        indexes = []
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE "
-                           "tablename = 'go_termuniprotentry';")
-            indexes = cursor.fetchall()
-            for index in indexes:
-                print(f"dropping index {index[0]}")
-                cursor.execute(f"DROP INDEX if EXISTS {index[0]};")
-
-        # ingest data
-        with connection.cursor() as cursor:
-            with gzip.open(GO_GPA_CSV, "r") as csv_file:
-                cursor.copy_expert(
-                    f"COPY go_termuniprotentry (uniprot_entry_id, qualifier, term_id,eco_term_id)"
-                    f" FROM STDIN WITH CSV", file=csv_file)
+    def create_from_gpa_file(cls, filename=GO_GPA_FILE, processes=None, threads=None):
+        """Replace all the associations with the ones in the gpa file
 
-        # redo indexes
-        with connection.cursor() as cursor:
-            for name, command in indexes:
-                print(f"adding back index {name}")
-                cursor.execute(command);
+        the file is decompressed while a process pool parses it, and the rows are piped
+        straight into COPY without intermediate files. constraints and indexes are dropped
+        during the load and built again at the end, one partition per thread.
 
-        # redo constraints
+        the load is NOT atomic: the TRUNCATE is committed first and COPY runs in several
+        connections (threads), so if the load fails the table is left empty or partially
+        loaded, without its constraints and indexes. run it again, or restore a backup,
+        before using the annotations
+        """
+        terms = set(Term.objects.values_list("id", flat=True))
+        eco_terms = dict(eco.Term.objects.values_list("id", "number"))
+        qualifiers = Qualifier.create_defaults()
+        table = cls._meta.db_table
+        partitions = cls.partitions()
+        threads = threads or max(1, min(len(partitions), os.cpu_count()))
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {table};")
+            constraints, indexes = cls._drop_constraints_and_indexes(cursor)
+        experimental = set(eco.Term.objects.experimental().values_list("number", flat=True))
+        resolver = Term.id_resolver()
+        print(f"Truncated {table}, it is incomplete until the load finishes")
+        # forked workers must not share the database connection
+        connections.close_all()
+        chunks = gpa.stream_copy_text(filename, terms, eco_terms, qualifiers,
+                                      resolver, experimental, processes=processes,
+                                      create_qualifier=Qualifier.id_of)
+        created = bulk.parallel_copy(table, gpa.COLUMNS, chunks, threads)
+        print(f"Created {created} Uniprot<->Go links")
         with connection.cursor() as cursor:
-            for name, definition in constraints:
-                print(f"adding back constraint {name}")
-                cursor.execute(f"ALTER TABLE go_termuniprotentry ADD CONSTRAINT {name} {definition};");
+            cursor.execute(f"""DELETE FROM {table} t WHERE NOT EXISTS (
+                                   SELECT 1 FROM {uniprot.Entry._meta.db_table} e
+                                   WHERE e.ac = t.uniprot_entry_id);""")
+            print(f"Deleted {cursor.rowcount} links to UniProt entries not in the database")
+        cls._create_constraints_and_indexes(constraints, indexes, partitions, threads)
+        PropagatedAnnotation.refresh()
+        uniprot.AnnotationFlags.refresh()
 
     @classmethod
-    def create_from_gpa_file(cls):
-        """Populates this table by reading from the gpa file"""
+    def update_from_gpa_file(cls, filename=GO_GPA_FILE, previous=None, processes=None,
+                             buckets=gpa.DIFF_BUCKETS):
+        """Apply only the differences between the associations and a new gpa file
+
+        the current associations (or the ones in the previous gpa file, if given) and the new
+        ones are split into bucket files on disk by a hash of the accession, and compared one
+        bucket at a time, so memory use does not depend on the size of the files. the files
+        are parsed before the transaction starts, with the database connection closed while
+        the parser processes are forked. only the added and removed annotations of UniProt
+        entries in the database are written to the table, in one transaction, and only the
+        propagated annotations of the changed entries are rebuilt
+        """
         terms = set(Term.objects.values_list("id", flat=True))
-        info = set()
-        batch_size = 1000000
-        acs = set()
-        with gzip.open(GO_GPA_FILE, "rt") as gpa_file:
-            for no, line in enumerate(gpa_file):
-                if line.startswith("UniProtKB"):
-                    words = line.split()
-                    uniprot_id = words[1]
-                    acs.add(uniprot_id)
-                    qualifier = words[2]
-                    term = int(words[3].split(":")[1])
-                    if term not in terms:
-                        print("(skipping) term not found", term, line)
-                        # if just a couple of missing terms, is probably a new annotation
-                        continue
-                    eco_term = words[5].split(":")[1].strip()
-                    info.add((term, uniprot_id, qualifier, eco_term))
-                if len(info) == batch_size:
-                    print("finished reading batch ", no)
-                    cls.create_objects_from_info(info, acs)
-                    print("start reading another batch")
-                    acs = set()
-                    info = set()
-
-            cls.create_objects_from_info(info, acs)
+        eco_terms = dict(eco.Term.objects.values_list("id", "number"))
+        qualifiers = Qualifier.create_defaults()
+        resolver = Term.id_resolver()
+        experimental = set(eco.Term.objects.experimental().values_list("number", flat=True))
+        table = cls._meta.db_table
+        columns = ", ".join(gpa.COLUMNS)
+        staging = f"{table}_diff"
+        GO_GPA_DIFF_FOLDER.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=GO_GPA_DIFF_FOLDER) as directory:
+            old = gpa.BucketWriter(directory, "old", buckets)
+            with connection.cursor() as cursor:
+                with gpa.BucketWriter(directory, "accessions", buckets) as accessions:
+                    cursor.copy_expert(f"COPY (SELECT ac FROM {uniprot.Entry._meta.db_table}) "
+                                       f"TO STDOUT", accessions)
+                if previous is None:
+                    # partitioned tables can only be copied out through a query
+                    with old:
+                        cursor.copy_expert(f"COPY (SELECT {columns} FROM {table}) TO STDOUT",
+                                           old)
+            # forked workers must not share the database connection
+            connections.close_all()
+            if previous is not None:
+                with old:
+                    for text in gpa.stream_copy_text(previous, terms, eco_terms, qualifiers,
+                                                     resolver, experimental, processes=processes,
+                                                     create_qualifier=Qualifier.id_of):
+                        old.write(text)
+            with gpa.BucketWriter(directory, "new", buckets) as new:
+                for text in gpa.stream_copy_text(filename, terms, eco_terms, qualifiers,
+                                                 resolver, experimental, processes=processes,
+                                                 create_qualifier=Qualifier.id_of):
+                    new.write(text)
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"CREATE TEMPORARY TABLE {staging} AS "
+                               f"SELECT {columns} FROM {table} WITH NO DATA;")
+                cursor.execute(f"ALTER TABLE {staging} ADD COLUMN deleted boolean;")
+                changes = gpa.diff_copy_text(old.filenames, new.filenames, accessions.filenames)
+                bulk.copy_file(staging, gpa.COLUMNS + ["deleted"], bulk.ChunkFile(changes),
+                               cursor=cursor)
+                cursor.execute(f"ANALYZE {staging};")
+                matches = " AND ".join(f"t.{column} = s.{column}" for column in gpa.COLUMNS)
+                cursor.execute(f"DELETE FROM {table} t USING {staging} s "
+                               f"WHERE s.deleted AND {matches};")
+                print(f"Deleted {cursor.rowcount} Uniprot<->Go links")
+                cursor.execute(f"""INSERT INTO {table} ({columns})
+                                   SELECT {columns} FROM {staging} s WHERE NOT s.deleted
+                                   ON CONFLICT DO NOTHING;""")
+                print(f"Created {cursor.rowcount} Uniprot<->Go links")
+                cursor.execute(f"SELECT DISTINCT uniprot_entry_id FROM {staging};")
+                changed = [row[0] for row in cursor.fetchall()]
+                cursor.execute(f"DROP TABLE {staging};")
+                PropagatedAnnotation.refresh(changed)
+                uniprot.AnnotationFlags.refresh()
+
+    @classmethod
+    def refresh_experimental(cls):
+        """set the experimental flag again, after the ECO ontology changes"""
+        experimental = eco.Term.objects.experimental()
+        changed = cls.objects.filter(eco_term__in=experimental, experimental=False)\
+            .update(experimental=True)
+        changed += cls.objects.filter(experimental=True).exclude(eco_term__in=experimental)\
+            .update(experimental=False)
+        print(f"Changed the experimental flag of {changed} Uniprot<->Go links")
 
     @classmethod
-    def create_objects_from_info(cls, info, acs):
-        """wrapper for bulk create to make it easir to call from create_objects"""
-        print("started checking existing for these uniprot acs", len(acs))
-        acs_db = set(uniprot.Entry.objects.filter(ac__in=acs).values_list("ac", flat=True))
-        print("finished reading acs")
-        # existing = {(t[0], t[1], t[2], t[3]) 
-                    # for t in cls.objects.filter(uniprot_entry_id__in=acs_db).values_list(
-                    # "term_id", "uniprot_entry_id", "qualifier", "eco_term_id")}
-        # print(f"existing with {len(acs_db)} acs: {len(existing)}")
-        # print(info.pop(), existing.pop())
-        # to_create = info - existing
-        objs = [cls(term_id=d[0], uniprot_entry_id=d[1],
-                qualifier=d[2], eco_term_id=d[3]) for d in info if d[1] in acs_db]
-        print(f"Creating {len(objs)} Uniprot<->Go links")
-        cls.objects.bulk_create(objs, batch_size=1000, ignore_conflicts=True)
-        print("finished")
+    def _drop_constraints_and_indexes(cls, cursor):
+        """drop them to make bulk loads faster, returns their definitions"""
+        table = cls._meta.db_table
+        cursor.execute(f"""SELECT conname, contype, pg_get_constraintdef(oid)
+                           FROM pg_constraint WHERE conrelid = '{table}'::regclass;""")
+        constraints = cursor.fetchall()
+        for name, _, _ in constraints:
+            print(f"dropping constraint {name}")
+            cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name};")
+        cursor.execute(f"SELECT indexname, indexdef FROM pg_indexes WHERE tablename = '{table}';")
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            print(f"dropping index {name}")
+            cursor.execute(f"DROP INDEX IF EXISTS {name};")
+        return constraints, indexes
+
+    @classmethod
+    def _create_constraints_and_indexes(cls, constraints, indexes, partitions, threads):
+        """create again the constraints and indexes dropped before a bulk load
+
+        on a partitioned table the indexes and unique constraints of every partition are
+        built in parallel and then attached to the ones of the parent table
+        """
+        table = cls._meta.db_table
+        parallel = []
+        on_parent = []
+        for name, command in indexes:
+            unique, using = INDEX_DEFINITION.match(command).groups()
+            unique = unique or ""
+            if not partitions:
+                on_parent.append(command)
+                continue
+            on_parent.append(f"CREATE {unique}INDEX {name} ON ONLY {table} {using}")
+            for partition in partitions:
+                partition_name = _partition_object_name(name, partition)
+                parallel.append(f"CREATE {unique}INDEX {partition_name} ON {partition} {using}")
+                on_parent.append(f"ALTER INDEX {name} ATTACH PARTITION {partition_name}")
+        for name, contype, definition in constraints:
+            if partitions and contype in ("p", "u"):
+                for partition in partitions:
+                    parallel.append(f"ALTER TABLE {partition} ADD CONSTRAINT "
+                                    f"{_partition_object_name(name, partition)} {definition}")
+            # attaches the constraints of the partitions when they exist
+            on_parent.append(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        print(f"building {len(parallel)} partition indexes with {threads} threads")
+        bulk.execute_parallel(parallel, threads)
+        with connection.cursor() as cursor:
+            for command in on_parent:
+                print(command)
+                cursor.execute(command)
+
 
+class PropagatedAnnotationQuerySet(models.QuerySet):
+
+    def with_qualifier(self, *names):
+        """annotations with any of these qualifiers"""
+        return self.filter(qualifier__in=Qualifier.objects.filter(name__in=names))
+
+    def functional(self):
+        """annotations related with the function of the protein"""
+        return self.filter(term__in=Term.objects.functional())
+
+    def direct(self):
+        """annotations to terms in the gpa file"""
+        return self.filter(direct=True)
+
+    def inferred(self):
+        """annotations only inferred from annotations to descendant terms"""
+        return self.filter(direct=False)
+
+
+class PropagatedAnnotation(models.Model):
+    """GO terms of UniProt entries including the ancestors of the annotated terms
+
+    every positive (not NOT|) association of TermUniProtEntry is propagated to all the is_a
+    ancestors of its term (true path rule), keeping its qualifier. direct is true when
+    the term itself is annotated. refresh after loading GO annotations or relations
+    """
+    uniprot_entry = models.ForeignKey(
+            "uniprot.Entry",
+            on_delete=models.CASCADE,
+            related_name="propagated_go_annotations")
+    term = models.ForeignKey(
+            "Term",
+            on_delete=models.CASCADE,
+            related_name="propagated_uniprot_annotations")
+    qualifier = models.ForeignKey("Qualifier", on_delete=models.PROTECT)
+    direct = models.BooleanField()
+
+    objects = PropagatedAnnotationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["uniprot_entry", "qualifier", "term"],
+                                    name="unique_go_propagated"),
+        ]
+        indexes = [
+            models.Index(fields=["term", "qualifier", "uniprot_entry"],
+                         name="go_propagated_term_idx"),
+        ]
+
+    @classmethod
+    @transaction.atomic
+    def refresh(cls, accessions=None, relations="is_a"):
+        """rebuild the propagated annotations with a single INSERT ... SELECT
+
+        only the annotations of these UniProt accessions are rebuilt, if given
+        """
+        table = cls._meta.db_table
+        params = [ontology.relation_key(relations, CLOSURE_RELATIONS)]
+        where = ""
+        with connection.cursor() as cursor:
+            if accessions is None:
+                cursor.execute(f"TRUNCATE {table};")
+            else:
+                accessions = list(accessions)
+                cursor.execute(f"DELETE FROM {table} WHERE uniprot_entry_id = ANY(%s);",
+                               [accessions])
+                where = "AND a.uniprot_entry_id = ANY(%s)"
+                params.append(accessions)
+            cursor.execute(f"""INSERT INTO {table} (uniprot_entry_id, qualifier_id, term_id, direct)
+                               SELECT a.uniprot_entry_id, a.qualifier_id, c.ancestor_id,
+                                      bool_or(c.depth = 0)
+                               FROM {TermUniProtEntry._meta.db_table} a
+                               JOIN {Closure._meta.db_table} c
+                                   ON c.descendant_id = a.term_id AND c.relation = %s
+                               JOIN {Qualifier._meta.db_table} q ON q.id = a.qualifier_id
+                               WHERE q.name NOT LIKE 'NOT|%%' {where}
+                               GROUP BY 1, 2, 3;""", params)
+            print(f"Created {cursor.rowcount} propagated GO annotations")
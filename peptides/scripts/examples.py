@@ -56,8 +56,11 @@ def run():
     bacteria_domain_queryset = Taxon.objects.filter(taxid=2)
     all_bacteria = Taxon.objects.children_of(bacteria_domain_queryset)
     print("All bacteria taxa", all_bacteria.distinct().count())
-    bacteria_peptides = peptides.filter(species__in=all_bacteria).distinct()
+    bacteria_peptides = peptides.in_taxa(bacteria_domain_queryset)
     print("number of bacteria peptides", bacteria_peptides.count())
+    # or, for a single taxon, the subtree range directly
+    bacteria = Taxon.objects.get(taxid=2)
+    print("number of bacteria peptides", peptides.filter(bacteria.subtree("species__")).count())
 
 
 
@@ -0,0 +1,170 @@
+"""Bulk loading helpers based on the PostgreSQL COPY command"""
+
+# python standard imports
+from concurrent.futures import ThreadPoolExecutor
+import io
+import itertools
+from queue import Queue
+import threading
+
+# django imports
+from django.db import connection, transaction
+
+
+def copy_value(value):
+    """format a python value for the COPY text format
+
+    json columns must be serialized by the caller
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t")\
+        .replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_line(row):
+    """format a row as a line of the COPY text format"""
+    return "\t".join(copy_value(value) for value in row) + "\n"
+
+
+class ChunkFile(io.TextIOBase):
+    """read only file object that streams text chunks already in the COPY text format
+
+    chunks are only requested when COPY asks for more data, so they can come from a
+    generator and never be all in memory at once
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            chunks.append(chunk)
+            length += len(chunk)
+        data = "".join(chunks)
+        if size < 0:
+            size = length
+        self._buffer = data[size:]
+        return data[:size]
+
+
+class RowFile(ChunkFile):
+    """read only file object that streams rows in the COPY text format
+
+    rows are only formatted when COPY asks for more data, so they can come from a generator
+    """
+
+    def __init__(self, rows):
+        super().__init__(copy_line(row) for row in rows)
+
+
+def copy_rows(table, columns, rows, cursor=None):
+    """stream rows into table with COPY, returns the number of rows copied"""
+    return copy_file(table, columns, RowFile(rows), cursor=cursor)
+
+
+def copy_file(table, columns, file, cursor=None):
+    """COPY a file object in the COPY text format into table, returns the number of rows"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    if cursor is not None:
+        cursor.copy_expert(sql, file)
+        return cursor.rowcount
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, file)
+        return cursor.rowcount
+
+
+def parallel_copy(table, columns, chunks, threads):
+    """COPY text chunks into table from several database connections at once
+
+    each thread has its own connection and commits its own COPY, so the load is not atomic.
+    only two chunks per thread are kept waiting. returns the number of rows copied
+
+    the first chunk is read before any connection is opened, so a generator that forks
+    worker processes (e.g. go.gpa.stream_copy_text) starts them before the threads exist
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    chunks = itertools.chain([] if first is None else [first], chunks)
+    if threads == 1:
+        return copy_file(table, columns, ChunkFile(chunks))
+    queue = Queue(maxsize=2 * threads)
+    copied = []
+    errors = []
+
+    def write():
+        try:
+            copied.append(copy_file(table, columns, ChunkFile(iter(queue.get, None))))
+        except Exception as error:
+            errors.append(error)
+            # keep reading so that the producer is never blocked
+            while queue.get() is not None:
+                pass
+        finally:
+            connection.close()
+
+    writers = [threading.Thread(target=write) for _ in range(threads)]
+    for writer in writers:
+        writer.start()
+    try:
+        for chunk in chunks:
+            queue.put(chunk)
+    finally:
+        for _ in writers:
+            queue.put(None)
+        for writer in writers:
+            writer.join()
+    if errors:
+        raise errors[0]
+    return sum(copied)
+
+
+def execute_parallel(statements, threads):
+    """run independent sql statements (e.g. index builds) in several database connections"""
+    def execute(sql):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(execute, statements))
+
+
+@transaction.atomic
+def copy_merge(table, columns, rows, update_conflicts=False, unique_fields=None):
+    """COPY rows into a staging table and merge them into table with a single insert
+
+    rows that conflict with existing rows (or with each other) are skipped. with
+    update_conflicts, rows conflicting on unique_fields update the existing rows instead
+    (rows must then be unique on unique_fields). returns the number of rows merged
+    """
+    staging = f"{table}_staging"
+    column_list = ", ".join(columns)
+    if update_conflicts:
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns
+                            if column not in unique_fields)
+        on_conflict = f"ON CONFLICT ({', '.join(unique_fields)}) DO UPDATE SET {updates}"
+    else:
+        on_conflict = "ON CONFLICT DO NOTHING"
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging} AS "
+                       f"SELECT {column_list} FROM {table} WITH NO DATA;")
+        copy_rows(staging, columns, rows, cursor=cursor)
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+                       f"{on_conflict};")
+        merged = cursor.rowcount
+        cursor.execute(f"DROP TABLE {staging};")
+    return merged
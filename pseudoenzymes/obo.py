@@ -0,0 +1,127 @@
+"""Streaming parser of OBO ontology files (GO, ECO) with cached snapshots
+
+the parsed ontology is pickled next to the obo file, keyed by the checksum of the file,
+so it is only parsed again when the file changes
+"""
+
+# python standard imports
+from collections import namedtuple
+import hashlib
+from pathlib import Path
+import pickle
+import re
+
+# id, name, namespace and definition are strings, obsolete a bool, alt_ids and replaced_by
+# lists of ids, relations a list of (relation type, id) with is_a and the relationship lines
+OboTerm = namedtuple("OboTerm", [
+    "id", "name", "namespace", "definition", "obsolete", "alt_ids", "replaced_by", "relations"
+])
+
+INSIDE_QUOTES = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+def read_terms(filename):
+    """yield an OboTerm for each [Term] stanza of an obo file, reading it line by line"""
+    with open(filename, "r") as obo_file:
+        info = None
+        for line in obo_file:
+            line = line.rstrip("\n")
+            if line.startswith("["):
+                if info is not None:
+                    yield _term(info)
+                info = {"alt_ids": [], "replaced_by": [], "relations": []} \
+                    if line == "[Term]" else None
+            elif info is None or ":" not in line:
+                continue
+            else:
+                tag, value = line.split(":", 1)
+                _read_tag(info, tag, value.strip())
+        if info is not None:
+            yield _term(info)
+
+
+def _read_tag(info, tag, value):
+    """add a tag-value line of a [Term] stanza to the term info"""
+    if tag in ("id", "name", "namespace"):
+        info[tag] = value
+    elif tag == "def":
+        info["definition"] = INSIDE_QUOTES.findall(value)[0][1:-1]\
+            .replace("\\\"", "\"").replace("\\n", "\n")
+    elif tag == "is_obsolete":
+        info["obsolete"] = value == "true"
+    elif tag == "alt_id":
+        info["alt_ids"].append(value)
+    elif tag == "replaced_by":
+        info["replaced_by"].append(value)
+    elif tag == "is_a":
+        info["relations"].append(("is_a", _strip_comment(value)))
+    elif tag == "relationship":
+        relation, target = _strip_comment(value).split()[:2]
+        info["relations"].append((relation, target))
+
+
+def _strip_comment(value):
+    """value of a tag without the trailing ! comment and {qualifiers}"""
+    return value.split("!")[0].split("{")[0].strip()
+
+
+def _term(info):
+    return OboTerm(info["id"], info.get("name", ""), info.get("namespace", ""),
+                   info.get("definition", ""), info.get("obsolete", False),
+                   info["alt_ids"], info["replaced_by"], info["relations"])
+
+
+def checksum(filename):
+    """md5 of the contents of a file"""
+    md5 = hashlib.md5()
+    with open(filename, "rb") as input_file:
+        while block := input_file.read(1024 * 1024):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+class Ontology:
+    """all the terms of an obo file, by id"""
+
+    def __init__(self, terms):
+        self.terms = {term.id: term for term in terms}
+
+    def __len__(self):
+        return len(self.terms)
+
+    @classmethod
+    def load(cls, filename):
+        """parse the obo file, or read the snapshot of this version of the file
+
+        the snapshot is created when there is none, older snapshots are deleted
+        """
+        filename = Path(filename)
+        snapshot = filename.with_name(f"{filename.name}.{checksum(filename)}.pickle")
+        if snapshot.exists():
+            with open(snapshot, "rb") as snapshot_file:
+                return pickle.load(snapshot_file)
+        ontology = cls(read_terms(filename))
+        for old_snapshot in filename.parent.glob(f"{filename.name}.*.pickle"):
+            old_snapshot.unlink()
+        with open(snapshot, "wb") as snapshot_file:
+            pickle.dump(ontology, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"Saved {len(ontology)} terms of {filename} to {snapshot}")
+        return ontology
+
+    def relations(self, prefix=""):
+        """(term, relation type, related term) of all the relations between ids with prefix"""
+        for term in self.terms.values():
+            if not term.id.startswith(prefix):
+                continue
+            for relation, target in term.relations:
+                if target.startswith(prefix):
+                    yield term.id, relation, target
+
+    def alt_ids(self):
+        """dict of the alternative ids of the terms to their primary id"""
+        return {alt_id: term.id for term in self.terms.values() for alt_id in term.alt_ids}
+
+    def replacements(self):
+        """dict of obsolete terms to the term replacing them, for those that have one"""
+        return {term.id: term.replaced_by[0] for term in self.terms.values()
+                if term.obsolete and term.replaced_by}
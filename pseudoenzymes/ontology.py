@@ -0,0 +1,41 @@
+"""Helpers shared by the ontology apps (go and eco)"""
+
+# python standard imports
+from collections import defaultdict, deque
+
+
+def closure_rows(terms, edges):
+    """(ancestor, descendant, depth) rows of the transitive closure of an ontology
+
+    terms are all the term ids and edges (child, parent) pairs. every term is its own
+    ancestor at depth 0, depth is the length of the shortest path to the ancestor
+    """
+    parents = defaultdict(list)
+    for child, parent in edges:
+        parents[child].append(parent)
+    for term in terms:
+        depths = {term: 0}
+        queue = deque([term])
+        while queue:
+            current = queue.popleft()
+            for parent in parents[current]:
+                if parent not in depths:
+                    depths[parent] = depths[current] + 1
+                    queue.append(parent)
+        for ancestor, depth in depths.items():
+            yield ancestor, term, depth
+
+
+def relation_key(relations, precomputed=None):
+    """name of a set of relation types in the closure tables, e.g. is_a+part_of
+
+    relations is a relation type or an iterable of them, in any order. with precomputed
+    (the CLOSURE_RELATIONS of an app) raises ValueError for sets without a closure
+    """
+    if isinstance(relations, str):
+        relations = [relations]
+    key = "+".join(sorted(set(relations)))
+    if precomputed is not None and key not in {relation_key(other) for other in precomputed}:
+        raise ValueError(f"no closure of {key}, precomputed closures are "
+                         f"{', '.join(relation_key(other) for other in precomputed)}")
+    return key
@@ -0,0 +1,52 @@
+"""Text search helpers based on PostgreSQL full-text search and pg_trgm
+
+models keep a SearchVector in a module constant and index the very same expression with a
+GinIndex, so that the filters below are served by the index
+"""
+
+# django imports
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (SearchQuery, SearchRank, SearchVector,
+                                            TrigramSimilarity)
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+SEARCH_CONFIG = "english"
+
+
+def search_vector(*fields):
+    """tsvector of these text fields, to be indexed and searched"""
+    return SearchVector(*fields, config=SEARCH_CONFIG)
+
+
+def search_query(text):
+    """tsquery from user text, supports quotes, OR and - like web search engines"""
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def vector_index(vector, name):
+    """GIN index on a search vector"""
+    return GinIndex(vector, name=name)
+
+
+def trigram_index(field, name):
+    """GIN trigram index, serves similarity, LIKE, ILIKE and regex filters on field"""
+    return GinIndex(fields=[field], opclasses=["gin_trgm_ops"], name=name)
+
+
+def text_search(queryset, vector, text, similar_field=None):
+    """rows whose vector matches text, or whose similar_field is similar to text
+
+    annotated with a rank (the highest of the text search rank and the trigram similarity)
+    and ordered by it
+    """
+    query = search_query(text)
+    queryset = queryset.annotate(search=vector)
+    if similar_field is None:
+        return queryset.filter(search=query)\
+                       .annotate(rank=SearchRank(F("search"), query))\
+                       .order_by("-rank")
+    return queryset.filter(Q(search=query) | Q(**{f"{similar_field}__trigram_similar": text}))\
+                   .annotate(rank=Greatest(SearchRank(F("search"), query),
+                                           TrigramSimilarity(similar_field, text)))\
+                   .order_by("-rank")
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     # 'django.contrib.sessions',
     # 'django.contrib.messages',
     # 'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'uniprot.apps.UniprotConfig',
     'go.apps.GoConfig',
     'eco.apps.EcoConfig',
@@ -158,7 +159,9 @@ GO_DATA_FOLDER.mkdir(parents=True, exist_ok=True)
 GENE_ONTOLOGY_FILE = GO_DATA_FOLDER / "go.obo"
 
 GO_GPA_FILE = GO_DATA_FOLDER / "goa_uniprot_all.gpa.gz"
-GO_GPA_CSV = GO_DATA_FOLDER / "for_ingestion.csv.gz"
+GO_DAG_FILE = GO_DATA_FOLDER / "go_dag.npz"
+# temporary bucket files of the incremental annotation updates (as large as the gpa file)
+GO_GPA_DIFF_FOLDER = GO_DATA_FOLDER / "gpa_diff"
 
 ECO_DATA_FOLDER = DATA_FOLDER / "eco"
 ECO_DATA_FOLDER.mkdir(parents=True, exist_ok=True)
@@ -189,6 +192,7 @@ NCBI_TAXDUMP_FILE = NCBI_FOLDER / "taxdump.tar.gz"
 NCBI_NAMES_FILE = NCBI_FOLDER / "names.dmp"
 NCBI_NODES_FILE = NCBI_FOLDER / "nodes.dmp"
 NCBI_MERGED_FILE = NCBI_FOLDER / "merged.dmp"
+TAXONOMY_TREE_FILE = NCBI_FOLDER / "taxonomy_tree.npz"
 
 # ANALYSIS OUTPUT
 OUT_FOLDER = BASE_DIR / "out"
@@ -18,8 +18,10 @@ Including another URLconf
 from django.urls import path
 
 import cath.views
+import pseudoenzymes.views
 
 urlpatterns = [
-    path("cath/superfamilies", cath.views.SuperfamiliesView.as_view(), name="superfamilies")
+    path("cath/superfamilies", cath.views.SuperfamiliesView.as_view(), name="superfamilies"),
+    path("search", pseudoenzymes.views.search, name="search"),
     # path('admin/', admin.site.urls),
 ]
@@ -0,0 +1,40 @@
+"""JSON views, e.g. the search across UniProt entries, GO terms and EC numbers"""
+
+from django.http import JsonResponse
+
+import ec.models as ec
+import go.models as go
+import uniprot.models as uniprot
+
+MIN_QUERY_LENGTH = 3
+MAX_RESULTS = 100
+
+
+def search(request):
+    """json list of UniProt entries, GO terms and EC numbers matching the q parameter
+
+    every kind of object is searched with its own indexes, limited to the best hits, and
+    the hits are then merged by rank
+    """
+    text = request.GET.get("q", "").strip()
+    try:
+        limit = min(int(request.GET.get("limit", 20)), MAX_RESULTS)
+    except ValueError:
+        limit = 20
+    if len(text) < MIN_QUERY_LENGTH:
+        return JsonResponse({"query": text, "results": []})
+
+    results = []
+    for ac, name, rank in uniprot.Entry.objects.search(text)\
+            .values_list("ac", "name", "rank")[:limit]:
+        results.append({"type": "uniprot", "id": ac, "name": name, "rank": rank})
+    for term in go.Term.objects.search(text).only("id", "name")[:limit]:
+        results.append({"type": "go", "id": term.code, "name": term.name, "rank": term.rank})
+    for number, name, rank in ec.Entry.objects.search(text)\
+            .values_list("number", "name", "rank")[:limit]:
+        results.append({"type": "ec", "id": number, "name": name, "rank": rank})
+    for number, name, rank in ec.Synonym.objects.search(text)\
+            .values_list("entry_id", "name", "rank")[:limit]:
+        results.append({"type": "ec_synonym", "id": number, "name": name, "rank": rank})
+    results.sort(key=lambda result: result["rank"], reverse=True)
+    return JsonResponse({"query": text, "results": results[:limit]})
@@ -0,0 +1,129 @@
+import io
+import random
+import time
+
+from Bio import SwissProt
+
+from uniprot import dat
+
+NUMBER_OF_RECORDS = 20000
+
+RECORD_HEADER = """ID   {name}_HUMAN             {data_class};         {length} AA.
+AC   {ac}; Q{secondary:05d};
+DT   01-JAN-1990, integrated into UniProtKB/Swiss-Prot.
+DT   01-JAN-1990, sequence version 1.
+DT   01-JAN-2020, entry version 10.
+DE   RecName: Full=Probable inactive hydrolase {{ECO:0000305}};
+DE            EC=3.1.1.1 {{ECO:0000269|PubMed:123}};
+DE   AltName: Full=Something else;
+GN   Name=ABC1; Synonyms=XYZ;
+OS   Homo sapiens (Human).
+OC   Eukaryota; Metazoa; Chordata; Craniata; Vertebrata; Euteleostomi;
+OC   Mammalia; Eutheria; Euarchontoglires; Primates; Haplorrhini.
+OX   NCBI_TaxID=9606;
+RN   [1]
+RP   NUCLEOTIDE SEQUENCE [MRNA].
+RX   PubMed=123; DOI=10.1000/xyz;
+RA   Doe J., Roe R.;
+RT   "A title that spans
+RT   two lines.";
+RL   J. Biol. Chem. 1:1-10(1990).
+CC   -!- FUNCTION: Hydrolyzes things to other things and this is a long
+CC       line that continues on the next line.
+CC   -!- CATALYTIC ACTIVITY:
+CC       Reaction=A + H2O = B + C; Xref=Rhea:RHEA:1, ChEBI:CHEBI:15377;
+CC         EC=3.1.1.1; Evidence={{ECO:0000269|PubMed:123}};
+CC   -!- CAUTION: Lacks the conserved active site residues.
+CC   ---------------------------------------------------------------------------
+CC   Copyrighted by the UniProt Consortium, see https://www.uniprot.org/terms
+CC   ---------------------------------------------------------------------------
+DR   EMBL; X00001; CAA00001.1; -; mRNA.
+DR   EMBL; X00002; CAA00002.1; -; Genomic_DNA.
+DR   CCDS; CCDS00001.1; -.
+DR   RefSeq; NP_000001.1; NM_000001.1.
+DR   PDB; 1ABC; X-ray; 2.00 A; A=1-{length}.
+DR   AlphaFoldDB; {ac}; -.
+DR   SMR; {ac}; -.
+DR   STRING; 9606.ENSP00000000001; -.
+DR   Ensembl; ENST00000000001.1; ENSP00000000001.1; ENSG00000000001.1.
+DR   GeneID; 1; -.
+DR   KEGG; hsa:1; -.
+DR   GO; GO:0005576; C:extracellular region; IEA:UniProtKB-SubCell.
+DR   GO; GO:0016787; F:hydrolase activity; IEA:UniProtKB-KW.
+DR   GO; GO:0006629; P:lipid metabolic process; IBA:GO_Central.
+DR   Gene3D; 3.40.50.1820; alpha/beta hydrolase; 1.
+DR   InterPro; IPR029058; AB_hydrolase_fold.
+DR   Pfam; PF00001; Hydrolase; 1.
+DR   SUPFAM; SSF53474; alpha/beta-Hydrolases; 1.
+DR   PROSITE; PS00001; HYDROLASE; 1.
+PE   1: Evidence at protein level;
+KW   Hydrolase {{ECO:0000256|ARBA:ARBA1}}; Reference proteome;
+KW   Signal.
+"""
+
+FEATURES = """FT   SIGNAL          1..20
+FT                   /evidence="ECO:0000255"
+FT   CHAIN           21..{length}
+FT                   /note="Probable inactive hydrolase"
+FT                   /id="PRO_0000000001"
+FT   DOMAIN          <30..?
+FT                   /note="A domain with a note that is long enough to continue
+FT                   on the next line"
+FT                   /evidence="ECO:0000255|PROSITE-ProRule:PRU00001,
+FT                   ECO:0000269|PubMed:123"
+FT   ACT_SITE        50
+FT                   /note="Nucleophile"
+FT   BINDING         60..65
+FT                   /ligand="ATP"
+FT                   /ligand_id="ChEBI:CHEBI:30616"
+FT   VAR_SEQ         70..75
+FT                   /note="MKTAYI -> MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQAPILSRVGDGTQD
+FT                   NLSGAEK (in isoform 2)"
+FT                   /id="VSP_000001"
+FT   MUTAGEN         ?80
+FT                   /note="S->A: Loss of activity."
+"""
+
+
+def run():
+    """compare the dat scanner with biopython's SwissProt parser on a synthetic file"""
+    data = synthetic_dat_file(NUMBER_OF_RECORDS)
+    print(f"Synthetic dat file with {NUMBER_OF_RECORDS} records ({len(data) / 1e6:.1f} MB)")
+
+    start = time.perf_counter()
+    biopython_records = [dat.record_from_swissprot(record)
+                         for record in SwissProt.parse(io.StringIO(data))]
+    biopython_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanner_records = list(dat.scan_records(io.StringIO(data)))
+    scanner_time = time.perf_counter() - start
+
+    assert scanner_records == biopython_records, "scanner and biopython records differ"
+    print(f"SwissProt.parse: {biopython_time:.2f} s ({NUMBER_OF_RECORDS / biopython_time:.0f} records/s)")
+    print(f"dat.scan_records: {scanner_time:.2f} s ({NUMBER_OF_RECORDS / scanner_time:.0f} records/s)")
+    print(f"speedup: {biopython_time / scanner_time:.1f}x")
+
+
+def synthetic_dat_file(number_of_records):
+    """text of a dat file with records similar to Swiss-Prot ones"""
+    random.seed(0)
+    records = []
+    for no in range(number_of_records):
+        length = random.randint(100, 600)
+        sequence = "".join(random.choice("ACDEFGHIKLMNPQRSTVWY") for _ in range(length))
+        lines = [RECORD_HEADER.format(
+            name=f"T{no:05d}",
+            data_class="Reviewed" if no % 2 else "Unreviewed",
+            length=length,
+            ac=f"P{no:05d}",
+            secondary=no,
+        )]
+        lines.append(FEATURES.format(length=length))
+        lines.append(f"SQ   SEQUENCE   {length} AA;  {length * 110} MW;  0123456789ABCDEF CRC64;\n")
+        for pos in range(0, length, 60):
+            block = sequence[pos:pos + 60]
+            lines.append("     " + " ".join(block[i:i + 10] for i in range(0, len(block), 10)) + "\n")
+        lines.append("//\n")
+        records.append("".join(lines))
+    return "".join(records)
@@ -5,7 +5,6 @@ import numpy as np
 from scipy.stats import truncnorm
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
-import networkx as nx
 
 
 import cath.models as cath
@@ -200,30 +199,11 @@ def plot_nseqs_by_pc_single_domain():
 def non_catalytic_functions():
     # TODO needs refactoring, was rushing to finish ppt
 
-    go_id_to_term = {t.id: t for t in go.Term.objects.all()}
-
-    ac_to_gos = defaultdict(set)
-    values = go.TermUniProtEntry.objects.functional().filter(qualifier="enables").values_list("uniprot_entry", "term__id")
-    for ac, term_name in values:
-        ac_to_gos[ac].add(term_name)
-
-    go_to_ancestors = go.Term.objects.go_to_ancestors()
-
-    protein_to_gos = defaultdict(set)
-    for cath, proteins in get_cath_to_uniprot().items():
-        if len(proteins) > 10:
-            for protein in proteins:
-                go_terms = ac_to_gos[protein]
-                for go_term in go_terms:
-                    protein_to_gos[protein].update(go_to_ancestors[go_term])
-
-    # gos_to_proteins = defaultdict(set)
-    # for protein, gos in protein_to_gos.items():
-        # for go_id in gos:
-            # gos_to_proteins[go_id].add(protein)
+    from go.dag import GoDag
+    from stats.enrichment import Enrichment
 
-    # gos_count = {go_id: len(proteins) for go_id, proteins in gos_to_proteins.items()}
-    # gos_count = {go_id: gos_count[go_id] for go_id in sorted(gos_count, key= lambda x: gos_count[x])}
+    go_id_to_term = {t.id: t for t in go.Term.objects.all()}
+    dag = GoDag.load(go.Term.objects.functional())
 
     cath_to_uniprot = get_cath_to_uniprot()
 
@@ -231,51 +211,39 @@ def non_catalytic_functions():
     fig, axs = plt.subplots(1, 4)
     fig.set_size_inches(9,5)
 
-    gos_to_cath = {}
     cath_family_type = get_cath_family_type(enzyme_set="go")
     cath_family_type["mixed_enzymes"] = cath_family_type["mixed"]
     cath_family_type["mixed_nonenzymes"] = cath_family_type["mixed"]
 
-    catalytic_go_ids = set(go.Term.objects.catalytic().values_list("id", flat=True))
+    # every family of every type is a group of proteins
+    groups = {}
+    for cath_type, cath_numbers in cath_family_type.items():
+        for cath_number in cath_numbers:
+            proteins = cath_to_uniprot[cath_number]
+            if cath_type == "mixed_nonenzymes":
+                proteins = proteins - enzymes
+            elif cath_type == "mixed_enzymes":
+                proteins = proteins & enzymes
+            groups[(cath_type, cath_number)] = proteins
+    enrichment = Enrichment.from_database(groups)
 
     go_to_type_to_pc = defaultdict(dict)
-    for plot, (cath_type, cath_numbers) in enumerate(cath_family_type.items()):
-        gos_to_cath[cath_type] = defaultdict(set)
-
-        for cath_number in cath_numbers:
-            for protein in cath_to_uniprot[cath_number]:
-                if protein in enzymes and cath_type == "mixed_nonenzymes":
-                    continue
-                if protein not in enzymes and cath_type == "mixed_enzymes":
-                    continue
-                # if protein in enzymes and cath_type == "nonenzymes":
-                    # print(protein, cath_number)
-                go_terms = protein_to_gos[protein]
-                for go_term in go_terms:
-                    gos_to_cath[cath_type][go_term].add(cath_number)
-
-    
-        for go_id, caths in gos_to_cath[cath_type].items():
-            pc = len(caths) / len(cath_numbers)
+    for cath_type, cath_numbers in cath_family_type.items():
+        fractions = enrichment.fraction_of_groups([(cath_type, n) for n in cath_numbers])
+        for go_id, pc in fractions.items():
             go_to_type_to_pc[go_id][cath_type] = pc
 
-    gos_to_cath.pop("mixed")
-
     max_gos = {}
     for go_id, inner in go_to_type_to_pc.items():
         for cath_type, pc in inner.items():
             max_gos[go_id] = max(max_gos.get(go_id, 0), pc)
 
-    graph = go.Term.objects.functional().go_graph()
-    
-    dfs = nx.dfs_tree(graph, 3674, depth_limit=2,
-                      sort_neighbors=lambda x: sorted(x, key=lambda i: max_gos.get(i, 0), reverse=True))
-    # print(dfs)
+    dfs = dag.walk(3674, depth_limit=2, key=lambda i: max_gos.get(i, 0))
 
     xs = []
     ys = [[], [], [], []]
 
-    cath_types = list(gos_to_cath.keys())
+    cath_types = [cath_type for cath_type in cath_family_type if cath_type != "mixed"]
     # print(cath_types)
 
     for go_id in dfs:
@@ -15,7 +15,7 @@ def uniprot_stats():
     # print("all swissprot entries", uniprot_entries.distinct().count())
 
     # # entries with a FUNCTION: section in the description
-    # functional = uniprot_entries.filter(comment__contains="FUNCTION:")
+    # functional = uniprot_entries.with_comment("FUNCTION")
     # print("with FUNCTION: description", functional.distinct().count())
     # catalytic = uniprot_entries.catalytic_activity()
     # print("with CATALYTIC ACTIVITY: description", catalytic.distinct().count())
@@ -25,7 +25,7 @@ def uniprot_stats():
     print("inactive", uniprot_entries.inactive().distinct().count())
     print("caution", uniprot_entries.caution().distinct().count())
 
-    # for entry in uniprot_entries.caution():
+    # for entry in uniprot_entries.caution().prefetch_related("comments"):
         # for caution in entry.cautions:
             # print(entry, caution)
     # for entry in catalytic:
@@ -36,22 +36,23 @@ def uniprot_stats():
 def go_stats():
     go_uniprot = go.TermUniProtEntry.objects.all()
     print("all go-uniprot associations: {} for {} swissprot sequences".format(
-          go_uniprot.distinct().count(),
+          go_uniprot.count(),
           go_uniprot.values("uniprot_entry_id").distinct().count(),
           ))
     functional = go_uniprot.functional()
     print("functional go-uniprot associations: {} for {} swissprot sequences".format(
-          functional.distinct().count(),
+          functional.count(),
           functional.values("uniprot_entry_id").distinct().count(),
           ))
+    # experimental rows are counted on the partial indexes of the experimental flag
     experimental = go_uniprot.experimental()
     print("experimental go-uniprot associations: {} for {} swissprot sequences".format(
-          experimental.distinct().count(),
+          experimental.count(),
           experimental.values("uniprot_entry_id").distinct().count(),
           ))
     functional_exp = functional.experimental()
     print("experimental functional go-uniprot associations: {} for {} swissprot sequences".format(
-          functional_exp.distinct().count(),
+          functional_exp.count(),
           functional_exp.values("uniprot_entry_id").distinct().count(),
           ))
 
@@ -62,9 +63,16 @@ def venn_enzyme_annotation():
 
     proteins = uniprot.Entry.objects.reviewed()
     print("number of proteins in venn diagram", proteins.count())
-    ec = set(proteins.enzymes_ec().values_list("ac", flat=True))
-    kw = set(proteins.enzymes_kw().values_list("ac", flat=True))
-    gos = set(proteins.enzymes_go().values_list("ac", flat=True))
+    # a single pass over the annotation flags, see uniprot.AnnotationFlags.refresh
+    ec, kw, gos = set(), set(), set()
+    for ac, has_ec, has_kw, has_go in proteins.values_list(
+            "ac", "flags__has_ec", "flags__has_enzyme_kw", "flags__has_catalytic_go"):
+        if has_ec:
+            ec.add(ac)
+        if has_kw:
+            kw.add(ac)
+        if has_go:
+            gos.add(ac)
     no_ez_count = proteins.count() - len(ec|kw|gos)
     plt.text(0.5, -0.41, f"No catalytic\nannotation\n{no_ez_count}")
     plt.text(0.5, -0.61, f"Total\n{proteins.count()}")
@@ -5,12 +5,12 @@ import subprocess
 from pathlib import Path
 from textwrap import wrap
 
-from ete3 import NCBITaxa
-ncbi = NCBITaxa()
 from ete3 import PhyloTree as etetree
 
 import cath.models as cath
 import uniprot.models as uniprot
+import taxonomy.models as taxonomy
+from taxonomy.tree import TaxonomyTree
 from pseudoenzymes.settings import (MSA_FOLDER, MSA_BY_DOMAIN_STRIP,
                                     TREE_OUT, NOTUNG_FOLDER, NOTUNG_JAR)
 
@@ -86,7 +86,7 @@ def run_mafft(folder=MSA_FOLDER):
     for path in folder.iterdir(): 
         if path.stem.endswith("_in"):
             commands.append(f"mafft --anysymbol --thread {n_cpu} --auto --leavegappyregion {path} "
-                            f"> {folder}/{path.stem.replace("in", "out")}.fasta "
+                            f"> {folder}/{path.stem.replace('in', 'out')}.fasta "
                             f"2> {folder}/{path.stem}.out")
     with ThreadPool() as pool:
         pool.map(lambda p: subprocess.run(p, shell=True), commands)
@@ -117,12 +117,13 @@ def run_notung(tree_folder: Path, notung_folder: Path):
     # this relationship is not one-to-one since some proteins from different
     # species can have the same sequence. this only happens in close species,
     # though, so it is not relevant for the rerooting
-    taxid_old2new = {t[0]: t[1] for t in ncbi.db.execute("SELECT * FROM merged").fetchall()}
+    taxid_old2new = taxonomy.Taxon.objects.all().old_to_new()
 
     seqid_to_taxid = {str(s): str(taxid_old2new.get(t, t)) 
                       for s, t in cath.SuperfamilyUniprotEntry.objects.values_list(
-                          "seq_id", "uniprot_entry__taxid")}
-    ncbi_tree = ncbi.get_topology(seqid_to_taxid.values())
+                          "seq_id", "uniprot_entry__species_id")}
+    # the whole ncbi taxonomy, the species tree of each family is extracted from it
+    ncbi_tree = TaxonomyTree.load()
 
     # do not overwrite or redo existing output files
     done = set([path.stem.split("_")[0] for path in notung_folder.glob("*rooting.ntglog")])
@@ -186,22 +187,14 @@ def run_notung_tree(tree_file, ncbi_tree, seqid_to_taxid, notung_folder):
     return
 
 def write_pruned_ncbi_tree(ncbi_tree, taxids, path):
-    """writes the ncbi newick tree here"""
-    ncbi_tree = ncbi_tree.copy()
-    ncbi_tree.prune(taxids, preserve_branch_length=True)
-
-    # intermediate nodes that appear in taxids will not be recognized by notung 
-    # (species when strain are also present). in this case, the function merges all the strains
-    # into the same species
-    name_change = {}
-    for node in ncbi_tree.traverse("preorder"):
-        if (not node.is_leaf()) and node.name in taxids:
-            for desc in node.get_descendants():
-                name_change[desc.name] = node.name
-                taxids.discard(desc.name)
-
-    ncbi_tree.prune(taxids, preserve_branch_length=True)
-    ncbi_tree.standardize()
-    # ncbi_tree.show()
-    ncbi_tree.write(outfile=path, format=8)
-    return name_change, taxids
+    """writes the ncbi newick tree of these taxids here
+
+    intermediate nodes that appear in taxids will not be recognized by notung
+    (species when strain are also present). in this case, the strains are merged into the
+    species. returns the merged taxids and the taxids of the leaves
+    """
+    newick, merged, leaves = ncbi_tree.newick(int(taxid) for taxid in taxids)
+    with open(path, "w") as newick_file:
+        newick_file.write(newick)
+    name_change = {str(taxid): str(new_taxid) for taxid, new_taxid in merged.items()}
+    return name_change, {str(taxid) for taxid in leaves}
@@ -1,7 +1,7 @@
 
 from django.db import transaction
 from django.db.models import F
-from uniprot.models import Entry, Keyword, Sequence
+from uniprot.models import AnnotationFlags, Comment, Entry, Feature, Keyword, Sequence
 import go.models as go
 import eco.models as eco
 import ec.models as ec
@@ -20,12 +20,23 @@ def run():
     print("add taxonomy data to DB")
     # taxonomy.Taxon.create_from_ncbi_files()
 
+    # tables derived from the dat files are filled in the same pass as the entries
+    # the ec sink needs the ec numbers (see below) to be loaded first
+    # sinks = Entry.dat_sinks() + [ec.EntryUniProtEntrySink()]
+
     print("Adding Swiss-prot data")
-    # Entry.create_from_dat_file(SWISSPROT_DAT_FILE)
+    # Entry.create_from_dat_file(SWISSPROT_DAT_FILE, sinks=sinks)
 
     print("Adding trembl UniProt data")
-    # use skip_first if restarting
-    # Entry.create_from_dat_file(UNIPROT_DAT_FILE, skip_first=0)
+    # only new and changed records are written, use retire=True with a new release
+    # to delete the entries that are no longer in it
+    # use resume=True if restarting, it continues after the last saved batch
+    # Entry.create_from_dat_file(UNIPROT_DAT_FILE, resume=False, sinks=sinks)
+    # parsing in parallel needs the uncompressed dat file
+    # Entry.create_from_dat_shards(UNIPROT_DAT_FILE, processes=64, resume=False, sinks=sinks)
+    # fill the feature table of entries loaded before it existed
+    # Feature.create_from_entries()
+    # Comment.create_from_entries()
 
     # PDB
     # wpdb.Entry.download_entries_idx()
@@ -46,9 +57,10 @@ def run():
     # eco.Relation.create_from_ontology_file()
 
     # link ontologies to uniprot entries
-    # go.TermUniProtEntry.prepare_csv_file_for_ingestion()
-    go.TermUniProtEntry.ingest_csv_file()
-    # go.TermUniProtEntry.create_from_gpa_file()
+    # streams the gpa file into the database, replacing all the associations
+    go.TermUniProtEntry.create_from_gpa_file(processes=16)
+    # or, for a new GOA release, write only the annotations that changed
+    # go.TermUniProtEntry.update_from_gpa_file(processes=16)
 
 
     # TODO go here
@@ -73,6 +85,9 @@ def run():
     # # TODO add ecs for nonswissprot files
     # ec.EntryUniProtEntry.create_from_pdb_uniprot_dat_file()
 
+    # # enzyme annotation flags, refreshed at the end of the UniProt, EC and GO loads
+    # AnnotationFlags.refresh()
+
 
     # # cath
     # cath.Superfamily.objects.all().delete()
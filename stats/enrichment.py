@@ -0,0 +1,132 @@
+"""GO term enrichment of groups of UniProt entries, e.g. CATH families
+
+annotations are read from go.PropagatedAnnotation, so proteins annotated with a term are
+annotated with all its ancestors too. the counts of all the groups and terms are computed
+at once as a product of sparse (group x protein) and (protein x term) matrices
+"""
+
+# library imports
+import numpy as np
+from scipy import sparse
+from scipy.stats import hypergeom
+
+import go.models as go
+
+
+def benjamini_hochberg(pvalues, number_of_tests=None):
+    """false discovery rate adjusted p-values (q-values)
+
+    number_of_tests can be larger than the number of p-values when the missing tests are
+    known to have p-values of 1, e.g. groups without any protein with a term
+    """
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    number_of_tests = number_of_tests or len(pvalues)
+    order = np.argsort(pvalues)
+    ranked = pvalues[order] * number_of_tests / np.arange(1, len(pvalues) + 1)
+    qvalues = np.empty_like(pvalues)
+    qvalues[order] = np.minimum.accumulate(ranked[::-1])[::-1]
+    return np.minimum(qvalues, 1)
+
+
+class Enrichment:
+    """over-representation of GO terms in groups of proteins
+
+    the population are the proteins of all the groups with at least one annotation. for
+    every group and term, the p-value is the probability of finding at least as many
+    proteins with the term in a random sample of the size of the group (one-sided Fisher's
+    exact test, i.e. the upper tail of the hypergeometric distribution)
+    """
+
+    def __init__(self, groups, annotations):
+        """groups is a dict of group names to accessions, annotations (accession, GO id) pairs"""
+        self.groups = list(groups)
+        self._group_rows = {group: row for row, group in enumerate(self.groups)}
+        members = {ac for acs in groups.values() for ac in acs}
+
+        acs, term_ids = [], []
+        for ac, term_id in annotations:
+            if ac in members:
+                acs.append(ac)
+                term_ids.append(term_id)
+        self.proteins, protein_columns = np.unique(np.array(acs, dtype=object),
+                                                   return_inverse=True)
+        self.term_ids, term_columns = np.unique(np.array(term_ids, dtype=np.int64),
+                                                return_inverse=True)
+        # (protein x term), 1 for annotated terms
+        self.annotations = sparse.csr_matrix(
+                (np.ones(len(acs), dtype=np.int32), (protein_columns, term_columns)),
+                shape=(len(self.proteins), len(self.term_ids)))
+        self.annotations.data[:] = 1
+
+        # (group x protein), only for proteins with annotations
+        protein_index = {ac: i for i, ac in enumerate(self.proteins)}
+        rows, columns = [], []
+        for row, group in enumerate(self.groups):
+            for ac in groups[group]:
+                if ac in protein_index:
+                    rows.append(row)
+                    columns.append(protein_index[ac])
+        self.membership = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                shape=(len(self.groups), len(self.proteins)))
+        self.membership.data[:] = 1
+
+        # (group x term) number of proteins of the group with the term
+        self.counts = (self.membership @ self.annotations).tocsr()
+        self.group_sizes = np.asarray(self.membership.sum(axis=1)).ravel()
+        self.term_sizes = np.asarray(self.annotations.sum(axis=0)).ravel()
+
+    @classmethod
+    def from_database(cls, groups, annotations=None):
+        """enrichment of the molecular functions enabled by the proteins of the groups
+
+        annotations is a queryset of go.PropagatedAnnotation to use instead
+        """
+        if annotations is None:
+            annotations = go.PropagatedAnnotation.objects.functional().with_qualifier("enables")
+        return cls(groups, annotations.values_list("uniprot_entry_id", "term_id").distinct())
+
+    @property
+    def population_size(self):
+        return len(self.proteins)
+
+    @property
+    def number_of_tests(self):
+        return len(self.groups) * len(self.term_ids)
+
+    def pvalues(self):
+        """(group x term) sparse matrix of p-values, only where the count is not zero
+
+        the p-values of zero counts are all 1 and are not stored
+        """
+        counts = self.counts.tocoo()
+        pvalues = hypergeom.sf(counts.data - 1, self.population_size,
+                               self.term_sizes[counts.col], self.group_sizes[counts.row])
+        return sparse.csr_matrix((pvalues, (counts.row, counts.col)), shape=counts.shape)
+
+    def results(self, alpha=0.05):
+        """(group, GO id, count, group size, term size, p-value, q-value) of the enriched terms
+
+        q-values are Benjamini-Hochberg corrected over all groups and terms. only the results
+        with q-value <= alpha are returned, sorted by q-value
+        """
+        pvalues = self.pvalues().tocoo()
+        qvalues = benjamini_hochberg(pvalues.data, self.number_of_tests)
+        counts = np.asarray(self.counts[pvalues.row, pvalues.col]).ravel()
+        results = []
+        for i in np.flatnonzero(qvalues <= alpha)[np.argsort(qvalues[qvalues <= alpha])]:
+            row, column = pvalues.row[i], pvalues.col[i]
+            results.append((self.groups[row], int(self.term_ids[column]), int(counts[i]),
+                            int(self.group_sizes[row]), int(self.term_sizes[column]),
+                            float(pvalues.data[i]), float(qvalues[i])))
+        return results
+
+    def fraction_of_groups(self, groups=None):
+        """dict of GO ids to the fraction of the groups with at least one protein with them"""
+        rows = np.arange(len(self.groups)) if groups is None \
+            else np.array([self._group_rows[group] for group in groups], dtype=np.int64)
+        if not len(rows):
+            return {}
+        with_term = np.asarray((self.counts[rows] > 0).sum(axis=0)).ravel()
+        return {int(self.term_ids[column]): float(with_term[column] / len(rows))
+                for column in np.flatnonzero(with_term)}
@@ -0,0 +1,77 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:46
+
+from collections import defaultdict
+import io
+
+from django.db import migrations, models
+
+
+def nested_set_intervals(parents):
+    """(lft, rgt) of every taxon, numbered from 1 in depth first pre-order
+
+    taxa that are their own parent or have no known parent are roots. children and roots
+    are visited in taxid order
+    """
+    children = defaultdict(list)
+    roots = []
+    for taxid in sorted(parents):
+        parent = parents[taxid]
+        if parent is None or parent == taxid or parent not in parents:
+            roots.append(taxid)
+        else:
+            children[parent].append(taxid)
+    intervals = {}
+    position = 0
+    for root in roots:
+        # taxa are pushed to be entered, and pushed again as (taxid, True) to be left
+        stack = [(root, False)]
+        while stack:
+            taxid, leaving = stack.pop()
+            if leaving:
+                intervals[taxid] = (intervals[taxid], position)
+                continue
+            position += 1
+            intervals[taxid] = position
+            stack.append((taxid, True))
+            stack.extend((child, False) for child in reversed(children[taxid]))
+    return intervals
+
+
+def set_intervals(apps, schema_editor):
+    """nested set intervals of the taxa already in the database"""
+    Taxon = apps.get_model("taxonomy", "Taxon")
+    intervals = nested_set_intervals(dict(Taxon.objects.values_list("taxid", "parent_id")))
+    rows = io.StringIO("".join(f"{taxid}\t{lft}\t{rgt}\n"
+                               for taxid, (lft, rgt) in intervals.items()))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("CREATE TEMPORARY TABLE taxon_intervals "
+                       "(taxid integer PRIMARY KEY, lft integer, rgt integer);")
+        cursor.copy_expert("COPY taxon_intervals (taxid, lft, rgt) FROM STDIN", rows)
+        cursor.execute("""UPDATE taxonomy_taxon t SET lft = s.lft, rgt = s.rgt
+                          FROM taxon_intervals s WHERE t.taxid = s.taxid;""")
+        cursor.execute("DROP TABLE taxon_intervals;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxonomy', '0003_rename_alternative_taxids_taxon_old_taxids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taxon',
+            name='lft',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='rgt',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(set_intervals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='taxon',
+            index=models.Index(fields=['lft', 'rgt'], name='taxon_interval_idx'),
+        ),
+    ]
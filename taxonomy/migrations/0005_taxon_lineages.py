@@ -0,0 +1,87 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:49
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+# lineages and rank columns of the taxa already in the database, taxa without a known
+# parent are roots
+SET_LINEAGES = """
+WITH RECURSIVE lineages (taxid, lineage, superkingdom_id, phylum_id, tax_class_id, order_id,
+                         family_id, genus_id) AS (
+    SELECT taxid, ARRAY[taxid],
+           CASE WHEN rank IN ('superkingdom', 'domain') THEN taxid END,
+           CASE WHEN rank = 'phylum' THEN taxid END,
+           CASE WHEN rank = 'class' THEN taxid END,
+           CASE WHEN rank = 'order' THEN taxid END,
+           CASE WHEN rank = 'family' THEN taxid END,
+           CASE WHEN rank = 'genus' THEN taxid END
+    FROM taxonomy_taxon r WHERE parent_id IS NULL OR parent_id = taxid
+        OR NOT EXISTS (SELECT 1 FROM taxonomy_taxon p WHERE p.taxid = r.parent_id)
+    UNION ALL
+    SELECT t.taxid, l.lineage || t.taxid,
+           CASE WHEN t.rank IN ('superkingdom', 'domain') THEN t.taxid ELSE l.superkingdom_id END,
+           CASE WHEN t.rank = 'phylum' THEN t.taxid ELSE l.phylum_id END,
+           CASE WHEN t.rank = 'class' THEN t.taxid ELSE l.tax_class_id END,
+           CASE WHEN t.rank = 'order' THEN t.taxid ELSE l.order_id END,
+           CASE WHEN t.rank = 'family' THEN t.taxid ELSE l.family_id END,
+           CASE WHEN t.rank = 'genus' THEN t.taxid ELSE l.genus_id END
+    FROM taxonomy_taxon t JOIN lineages l ON t.parent_id = l.taxid
+    WHERE t.parent_id <> t.taxid
+)
+UPDATE taxonomy_taxon t SET lineage = l.lineage, superkingdom_id = l.superkingdom_id,
+    phylum_id = l.phylum_id, tax_class_id = l.tax_class_id, order_id = l.order_id,
+    family_id = l.family_id, genus_id = l.genus_id
+FROM lineages l WHERE t.taxid = l.taxid;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxonomy', '0004_taxon_intervals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taxon',
+            name='family',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='taxonomy.taxon'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='genus',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='taxonomy.taxon'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='lineage',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='taxonomy.taxon'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='phylum',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='taxonomy.taxon'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='superkingdom',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='taxonomy.taxon'),
+        ),
+        migrations.AddField(
+            model_name='taxon',
+            name='tax_class',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='taxonomy.taxon'),
+        ),
+        migrations.RunSQL(SET_LINEAGES, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='taxon',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['lineage'], name='taxon_lineage_gin_idx'),
+        ),
+    ]
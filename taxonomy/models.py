@@ -5,12 +5,16 @@ import gzip
 import tarfile
 
 # django imports
-from django.db import models
+from django.db import models, connection, transaction
+from django.db.models import Exists, OuterRef, Q
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 
 # library imports
+from pseudoenzymes import bulk
 from pseudoenzymes.settings import (NCBI_TAXDUMP_FILE, NCBI_FOLDER, NCBI_NAMES_FILE,
-                                    NCBI_NODES_FILE, NCBI_MERGED_FILE)
+                                    NCBI_NODES_FILE, NCBI_MERGED_FILE, TAXONOMY_TREE_FILE)
+from taxonomy.tree import nested_set_intervals
 
 class TaxonQuerySet(models.QuerySet):
 
@@ -23,16 +27,22 @@ class TaxonQuerySet(models.QuerySet):
         return out
 
     def children_of(self, parents):
-        """recursively find all taxa that are children of these parent taxa
+        """find all taxa that are children of these parent taxa, at any depth
 
-        parents are included in the resulting query
+        parents are included in the resulting query. a single range predicate on the
+        nested set intervals, see Taxon.rebuild_intervals
         """
-        ids = set(parents.values_list("taxid", flat=True))
-        no_previous_ids = 0
-        while no_previous_ids != len(ids):
-            no_previous_ids = len(ids)
-            ids.update(Taxon.objects.filter(parent__in=ids).values_list("taxid", flat=True))
-        return self.filter(pk__in=ids)
+        return self.filter(Exists(parents.filter(lft__lte=OuterRef("lft"),
+                                                 rgt__gte=OuterRef("lft"))))
+
+    def with_ancestor(self, taxid):
+        """taxa with this taxid in their lineage, itself included (uses the GIN index)"""
+        return self.filter(lineage__contains=[taxid])
+
+def rank_field():
+    """taxon of a rank in the lineage of a taxon, see Taxon.rebuild_lineages"""
+    return models.ForeignKey("Taxon", null=True, on_delete=models.SET_NULL, related_name="+",
+                             db_constraint=False)
 
 class Taxon(models.Model):
     """A biological species"""
@@ -47,6 +57,28 @@ class Taxon(models.Model):
     rank = models.CharField(max_length=30)
     name = models.CharField(max_length=255, blank=False)
     common_name = models.CharField(max_length=255, blank=True)
+    # nested set interval, the subtree of a taxon are the taxa with lft in [lft, rgt]
+    lft = models.IntegerField(null=True)
+    rgt = models.IntegerField(null=True)
+    # taxids from the root to the taxon, itself included
+    lineage = ArrayField(models.IntegerField(), null=True)
+    # the ancestors of the main ranks (or the taxon itself), null if not in the lineage
+    superkingdom = rank_field()
+    phylum = rank_field()
+    tax_class = rank_field()
+    order = rank_field()
+    family = rank_field()
+    genus = rank_field()
+
+    # rank columns and the NCBI ranks stored in them (domain replaced superkingdom in 2025)
+    RANKS = {
+        "superkingdom": ["superkingdom", "domain"],
+        "phylum": ["phylum"],
+        "tax_class": ["class"],
+        "order": ["order"],
+        "family": ["family"],
+        "genus": ["genus"],
+    }
 
     objects = TaxonQuerySet.as_manager()
 
@@ -58,6 +90,18 @@ class Taxon(models.Model):
 
     class Meta:
         verbose_name_plural = "Taxa"
+        indexes = [
+            models.Index(fields=["lft", "rgt"], name="taxon_interval_idx"),
+            GinIndex(fields=["lineage"], name="taxon_lineage_gin_idx"),
+        ]
+
+    def subtree(self, prefix=""):
+        """Q object selecting the taxa of the subtree of this taxon, itself included
+
+        prefix is the path to the taxon from the model being filtered, e.g.
+        uniprot.Entry.objects.filter(taxon.subtree("species__"))
+        """
+        return Q(**{f"{prefix}lft__gte": self.lft, f"{prefix}lft__lte": self.rgt})
 
     @classmethod
     def download_taxdump_from_ncbi(cls):
@@ -102,3 +146,65 @@ class Taxon(models.Model):
 
         print(f"Creating {len(to_create)} new Taxon objects")
         cls.objects.bulk_create(to_create, batch_size=10000)
+        cls.rebuild_intervals()
+        cls.rebuild_lineages()
+
+    @classmethod
+    @transaction.atomic
+    def rebuild_intervals(cls):
+        """number the taxa in depth first order and set their nested set intervals"""
+        intervals = nested_set_intervals(dict(cls.objects.values_list("taxid", "parent_id")))
+        staging = f"{cls._meta.db_table}_intervals"
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMPORARY TABLE {staging} "
+                           f"(taxid integer PRIMARY KEY, lft integer, rgt integer);")
+            bulk.copy_rows(staging, ["taxid", "lft", "rgt"],
+                           ((taxid, lft, rgt) for taxid, (lft, rgt) in intervals.items()),
+                           cursor=cursor)
+            cursor.execute(f"""UPDATE {cls._meta.db_table} t SET lft = s.lft, rgt = s.rgt
+                               FROM {staging} s WHERE t.taxid = s.taxid;""")
+            print(f"Set the intervals of {cursor.rowcount} taxa")
+            cursor.execute(f"DROP TABLE {staging};")
+        # cached by taxonomy.tree.TaxonomyTree.load
+        TAXONOMY_TREE_FILE.unlink(missing_ok=True)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild_lineages(cls):
+        """set the lineage and rank columns of all the taxa in a single UPDATE
+
+        a recursive query walks down the tree from the roots (taxa without a known parent,
+        as in nested_set_intervals), appending each taxon to the lineage of its parent and
+        replacing the rank columns of the parent by the taxon when it is of that rank
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(*lineages_sql(cls._meta.db_table, cls.RANKS))
+            print(f"Set the lineages of {cursor.rowcount} taxa")
+
+
+def lineages_sql(table, ranks):
+    """(sql, params) updating the lineage and the rank columns of all the taxa of table
+
+    ranks is a dict of the rank columns (without _id) to the NCBI ranks stored in them
+    """
+    columns = [f"{column}_id" for column in ranks]
+    root_ranks, child_ranks = [], []
+    for column, names in ranks.items():
+        placeholders = ", ".join(["%s"] * len(names))
+        root_ranks.append(f"CASE WHEN rank IN ({placeholders}) THEN taxid END")
+        child_ranks.append(f"CASE WHEN t.rank IN ({placeholders}) THEN t.taxid "
+                           f"ELSE l.{column}_id END")
+    params = [name for names in ranks.values() for name in names] * 2
+    sql = f"""WITH RECURSIVE lineages (taxid, lineage, {", ".join(columns)}) AS (
+                  SELECT taxid, ARRAY[taxid], {", ".join(root_ranks)}
+                  FROM {table} r WHERE parent_id IS NULL OR parent_id = taxid
+                      OR NOT EXISTS (SELECT 1 FROM {table} p WHERE p.taxid = r.parent_id)
+                  UNION ALL
+                  SELECT t.taxid, l.lineage || t.taxid, {", ".join(child_ranks)}
+                  FROM {table} t JOIN lineages l ON t.parent_id = l.taxid
+                  WHERE t.parent_id <> t.taxid
+              )
+              UPDATE {table} t SET lineage = l.lineage,
+                  {", ".join(f"{column} = l.{column}" for column in columns)}
+              FROM lineages l WHERE t.taxid = l.taxid;"""
+    return sql, params
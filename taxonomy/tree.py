@@ -0,0 +1,245 @@
+"""In-memory NCBI taxonomy tree backed by numpy arrays
+
+taxa are referred to by their position in the sorted array of taxids. the tree is stored
+as the parent of every taxon and its depth first pre-order (tin is the position of a
+taxon in the order and tout the last position of its subtree). the lowest common ancestor
+of two taxa is the parent of the shallowest taxon between them in the pre-order, found
+in constant time with a sparse table of range minima over blocks of the order
+"""
+
+# python standard imports
+from pathlib import Path
+
+# library imports
+import numpy as np
+
+from pseudoenzymes.settings import TAXONOMY_TREE_FILE
+
+# positions of the pre-order in each block of the range minimum sparse table
+RMQ_BLOCK_SIZE = 16
+
+
+class TaxonomyTree:
+    """taxonomy tree with constant time LCA and induced subtrees"""
+
+    def __init__(self, taxids, parent_taxids):
+        """taxids and the taxids of their parents, taxa without parent (or that are their
+        own parent) are roots"""
+        taxids = np.asarray(taxids, dtype=np.int64)
+        parent_taxids = np.asarray([-1 if parent is None else parent for parent in parent_taxids],
+                                   dtype=np.int64)
+        order = np.argsort(taxids)
+        self.taxids = taxids[order]
+        parent_taxids = parent_taxids[order]
+        positions = np.searchsorted(self.taxids, parent_taxids)
+        positions[positions == len(self.taxids)] = 0
+        known = self.taxids[positions] == parent_taxids
+        self.parents = np.where(known & (parent_taxids != self.taxids), positions, -1)\
+            .astype(np.int32)
+        self._preorder()
+        self._build_sparse_table()
+
+    def __len__(self):
+        return len(self.taxids)
+
+    def _preorder(self):
+        """depth first pre-order, with children and roots in taxid order"""
+        size = len(self.taxids)
+        has_parent = self.parents >= 0
+        children = np.flatnonzero(has_parent)
+        # stable sort keeps the children of each taxon in taxid order
+        children = children[np.argsort(self.parents[children], kind="stable")]
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parents[children], minlength=size), out=indptr[1:])
+
+        children, indptr = children.tolist(), indptr.tolist()
+        order = []
+        depth = [0] * size
+        tout = [0] * size
+        for root in np.flatnonzero(~has_parent).tolist():
+            # taxa are pushed to be entered, and pushed again as ~taxon to be left
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if node < 0:
+                    tout[~node] = len(order) - 1
+                    continue
+                order.append(node)
+                stack.append(~node)
+                node_children = children[indptr[node]:indptr[node + 1]]
+                for child in node_children:
+                    depth[child] = depth[node] + 1
+                stack.extend(reversed(node_children))
+        self.order = np.array(order, dtype=np.int32)
+        self.depth = np.array(depth, dtype=np.int32)
+        self.tout = np.array(tout, dtype=np.int32)
+        self.tin = np.empty(size, dtype=np.int32)
+        self.tin[self.order] = np.arange(size, dtype=np.int32)
+
+    def _build_sparse_table(self):
+        """sparse table of the positions of the shallowest taxa of ranges of blocks"""
+        depths = self.depth[self.order]
+        padding = -len(depths) % RMQ_BLOCK_SIZE
+        padded = np.concatenate([depths, np.full(padding, np.iinfo(np.int32).max, np.int32)])
+        blocks = padded.reshape(-1, RMQ_BLOCK_SIZE)
+        self._order_depths = depths
+        level = np.argmin(blocks, axis=1) + np.arange(len(blocks)) * RMQ_BLOCK_SIZE
+        self._table = [level]
+        width = 1
+        while 2 * width <= len(blocks):
+            previous = self._table[-1]
+            left, right = previous[:-width], previous[width:]
+            self._table.append(np.where(padded[left] <= padded[right], left, right))
+            width *= 2
+
+    @classmethod
+    def from_database(cls):
+        """build the tree from the taxonomy.Taxon table"""
+        import taxonomy.models as taxonomy
+        taxids, parents = zip(*taxonomy.Taxon.objects.values_list("taxid", "parent_id"))
+        return cls(taxids, parents)
+
+    @classmethod
+    def load(cls, filename=TAXONOMY_TREE_FILE):
+        """build the tree from the cached taxonomy, creating the cache if needed
+
+        the cache is deleted when the taxonomy intervals are rebuilt
+        """
+        filename = Path(filename)
+        if not filename.exists():
+            tree = cls.from_database()
+            tree.save(filename)
+            return tree
+        arrays = np.load(filename)
+        tree = cls.__new__(cls)
+        for name in ("taxids", "parents", "order", "depth", "tin", "tout"):
+            setattr(tree, name, arrays[name])
+        tree._build_sparse_table()
+        return tree
+
+    def save(self, filename=TAXONOMY_TREE_FILE):
+        np.savez(filename, taxids=self.taxids, parents=self.parents, order=self.order,
+                 depth=self.depth, tin=self.tin, tout=self.tout)
+        print(f"Saved {len(self)} taxa to {filename}")
+
+    def index(self, taxids):
+        """positions of these taxids, raises KeyError for unknown taxids"""
+        taxids = np.asarray(taxids, dtype=np.int64)
+        positions = np.searchsorted(self.taxids, taxids)
+        positions[positions == len(self.taxids)] = 0
+        if not np.array_equal(self.taxids[positions], taxids):
+            missing = taxids[self.taxids[positions] != taxids]
+            raise KeyError(f"taxids not in the tree: {missing[:10].tolist()}")
+        return positions
+
+    def intervals(self):
+        """dict of taxids to their nested set interval (lft, rgt), numbered from 1"""
+        return dict(zip(self.taxids.tolist(),
+                        zip((self.tin + 1).tolist(), (self.tout + 1).tolist())))
+
+    def is_ancestor(self, ancestor, node):
+        """whether the taxon at position ancestor is node or one of its ancestors"""
+        return self.tin[ancestor] <= self.tin[node] <= self.tout[ancestor]
+
+    def _shallowest(self, start, end):
+        """pre-order position of the shallowest taxon in positions [start, end]"""
+        depths = self._order_depths
+        first_block, last_block = start // RMQ_BLOCK_SIZE, end // RMQ_BLOCK_SIZE
+        if last_block - first_block < 2:
+            return start + int(np.argmin(depths[start:end + 1]))
+        candidates = []
+        left_end = (first_block + 1) * RMQ_BLOCK_SIZE
+        candidates.append(start + int(np.argmin(depths[start:left_end])))
+        right_start = last_block * RMQ_BLOCK_SIZE
+        candidates.append(right_start + int(np.argmin(depths[right_start:end + 1])))
+        first_block, last_block = first_block + 1, last_block - 1
+        level = int(np.log2(last_block - first_block + 1))
+        table = self._table[level]
+        candidates.append(int(table[first_block]))
+        candidates.append(int(table[last_block - (1 << level) + 1]))
+        return min(candidates, key=lambda position: depths[position])
+
+    def lca_index(self, u, v):
+        """position of the lowest common ancestor of the taxa at positions u and v
+
+        -1 if they are in different trees
+        """
+        if self.is_ancestor(u, v):
+            return u
+        if self.is_ancestor(v, u):
+            return v
+        start, end = sorted((int(self.tin[u]), int(self.tin[v])))
+        return int(self.parents[self.order[self._shallowest(start + 1, end)]])
+
+    def lca(self, taxid1, taxid2):
+        """taxid of the lowest common ancestor of two taxa, None if they are not related"""
+        u, v = self.index([taxid1, taxid2])
+        ancestor = self.lca_index(u, v)
+        return None if ancestor < 0 else int(self.taxids[ancestor])
+
+    def induced_subtree(self, taxids):
+        """smallest subtree connecting these taxa, without unbranched intermediate taxa
+
+        taxa of the set inside the subtree of other taxa of the set are merged into them
+        (e.g. strains into their species). returns (dict of merged taxids to the taxid they
+        were merged into, dict of the taxids of the subtree to the taxids of their children,
+        root taxid). runs in O(k log k) for k taxa
+        """
+        nodes = np.unique(self.index(list(taxids)))
+        nodes = nodes[np.argsort(self.tin[nodes])].tolist()
+        merged = {}
+        leaves = []
+        for node in nodes:
+            if leaves and self.is_ancestor(leaves[-1], node):
+                merged[int(self.taxids[node])] = int(self.taxids[leaves[-1]])
+            else:
+                leaves.append(node)
+
+        nodes = set(leaves)
+        for u, v in zip(leaves, leaves[1:]):
+            ancestor = self.lca_index(u, v)
+            if ancestor >= 0:
+                nodes.add(ancestor)
+        nodes = sorted(nodes, key=lambda node: self.tin[node])
+        children = {int(self.taxids[node]): [] for node in nodes}
+        roots = []
+        stack = []
+        for node in nodes:
+            while stack and not self.is_ancestor(stack[-1], node):
+                stack.pop()
+            if stack:
+                children[int(self.taxids[stack[-1]])].append(int(self.taxids[node]))
+            else:
+                roots.append(int(self.taxids[node]))
+            stack.append(node)
+        return merged, children, roots[0] if len(roots) == 1 else None
+
+    def newick(self, taxids):
+        """newick string of the induced subtree of these taxa, named by taxid
+
+        returns (newick, dict of merged taxids, taxids of the leaves). see induced_subtree
+        """
+        merged, children, root = self.induced_subtree(taxids)
+        if root is None:
+            raise ValueError("taxa are in different trees")
+
+        def write(node):
+            if not children[node]:
+                return str(node)
+            return f"({','.join(write(child) for child in children[node])}){node}"
+
+        leaves = {taxid for taxid, taxid_children in children.items() if not taxid_children}
+        return write(root) + ";", merged, leaves
+
+
+def nested_set_intervals(parents):
+    """(lft, rgt) of every taxon of the tree, numbered in depth first pre-order
+
+    parents is a dict of taxids to parent taxids. lft is the position of the taxon and rgt
+    the largest position in its subtree, so taxon b is in the subtree of a (or is a) when
+    a.lft <= b.lft <= a.rgt. taxa that are their own parent (the root) or have no known
+    parent start a new tree
+    """
+    if not parents:
+        return {}
+    return TaxonomyTree(list(parents), list(parents.values())).intervals()
@@ -0,0 +1,398 @@
+"""Helpers to read UniProt flat (dat) files"""
+
+# python standard imports
+from collections import deque, namedtuple
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+from multiprocessing import Pool
+from pathlib import Path
+
+# library imports
+from Bio import bgzf
+from Bio.SeqFeature import Position, UnknownPosition
+
+# shards are small enough to be parsed in memory by a worker
+SHARD_SIZE = 64 * 1024 * 1024
+# chunk size used to skip decompressed data when resuming plain gzip files
+SKIP_CHUNK_SIZE = 16 * 1024 * 1024
+RECORD_END = b"//\n"
+GZIP_MAGIC = b"\x1f\x8b"
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+
+
+FT_QUALIFIER = re.compile(r"^/([a-z_]+)=")
+# line types not used by the models
+SKIPPED_LINES = {"DR", "DT", "GN", "OS", "OG", "OC", "OH", "RN", "RP", "RC", "RX", "RL", "RA",
+                 "RG", "RT", "PE", "SQ", "**"}
+
+DatRecord = namedtuple("DatRecord", [
+    "accessions",
+    "entry_name",
+    "data_class",
+    "taxid",
+    "description",
+    "comments",
+    "keywords",
+    "features",
+    "sequence",
+])
+DatRecord.__doc__ = """The parts of a dat file record used by the models
+
+values are the same biopython's SwissProt parser produces, except for taxid (first NCBI
+taxid as an integer) and features, which are already in the Entry.features json format
+"""
+
+
+class Sink:
+    """Receives every batch of records read from a dat file
+
+    see uniprot.models.Entry.create_from_dat_file. all the sinks write a batch in the same
+    transaction, in the order they are given
+    """
+
+    def write(self, records):
+        """write the rows derived from this batch of DatRecords
+
+        must be idempotent, records already in the database are written again when loading
+        without a ReleaseDiff or resuming from a checkpoint
+        """
+        raise NotImplementedError
+
+    def delete(self, acs):
+        """delete the rows derived from these accessions, their records changed
+
+        called before the new version of the records is written
+        """
+
+    def close(self):
+        """called after the last batch was written"""
+
+
+def scan_records(lines):
+    """yield a DatRecord for every record in these dat file text lines
+
+    a much faster alternative to SwissProt.parse that only reads the lines used by the
+    models (ID, AC, DE, OX, CC, KW, FT and the sequence) and skips everything else.
+    raises ValueError if there is data before the first ID line, e.g. when reading from an
+    offset that is not at the start of a record
+    """
+    entry_name = data_class = taxid = feature = qualifier = None
+    accessions, description, comments, keywords, features, sequence = [], [], [], [], [], []
+    in_record = False
+    for line in lines:
+        key = line[:2]
+        if not in_record and key != "ID":
+            if line.strip():
+                raise ValueError(f"dat data outside of a record, before an ID line: {line!r}")
+            continue
+        if key in SKIPPED_LINES:
+            continue
+        if key == "  ":
+            sequence.append(line[5:].replace(" ", "").rstrip())
+        elif key == "FT":
+            if line[5:13].strip():
+                feature = _read_feature(line)
+                features.append(feature)
+                qualifier = None
+            else:
+                qualifier = _read_feature_qualifier(feature, qualifier, line[21:].rstrip())
+        elif key == "CC":
+            topic, value = line[5:8], line[9:].rstrip()
+            if topic == "-!-" or (topic == "   " and not comments):
+                comments.append(value)
+            elif topic == "   ":
+                comments[-1] += " " + value
+        elif key == "DE":
+            description.append(line[5:].strip())
+        elif key == "KW":
+            for keyword in line[5:].rstrip().rstrip(";.").split("; "):
+                if keyword.endswith("}"):
+                    # discard the evidence code
+                    keyword = keyword.rsplit("{", 1)[0]
+                keywords.append(keyword.strip())
+        elif key == "AC":
+            accessions.extend(line[5:].rstrip().rstrip(";").split("; "))
+        elif key == "OX":
+            if taxid is None:
+                taxids = line.split("{")[0][5:].rstrip().rstrip(";").split("=")[1]
+                taxid = int(taxids.split(", ")[0])
+        elif key == "ID":
+            cols = line[5:].split()
+            entry_name, data_class = cols[0], cols[1].rstrip(";")
+            accessions, description, comments, keywords, features, sequence = \
+                [], [], [], [], [], []
+            taxid = None
+            in_record = True
+        elif key == "//":
+            in_record = False
+            yield DatRecord(accessions, entry_name, data_class, taxid, " ".join(description),
+                            comments, keywords, features, "".join(sequence))
+
+
+def record_checksum(record):
+    """md5 of all the values of a DatRecord, changes whenever the stored data changes"""
+    return hashlib.md5(json.dumps(record).encode("utf-8")).hexdigest()
+
+
+def _read_position(text, offset=0):
+    """integer value of a feature position, None if unknown"""
+    if text == "?":
+        return None
+    if text[0] in "?<>":
+        return int(text[1:]) + offset
+    try:
+        return int(text) + offset
+    except ValueError:
+        return int(Position.fromstring(text, offset))
+
+
+def _read_feature(line):
+    """new feature from the first FT line of a feature"""
+    location = line[21:80].rstrip()
+    # isoform features start with the isoform id
+    location = location.split(":")[-1]
+    if ".." in location:
+        start, end = location.split("..")
+        start, end = _read_position(start, -1), _read_position(end)
+    else:
+        start = _read_position(location, -1)
+        end = start + 1 if start is not None else None
+    return {"location": [start, end], "type": line[5:13].rstrip(), "qualifiers": {}}
+
+
+def _read_feature_qualifier(feature, qualifier, value):
+    """add a feature qualifier line to the feature, returns the qualifier being read"""
+    qualifiers = feature["qualifiers"]
+    match = FT_QUALIFIER.match(value)
+    if match:
+        name = match.group(1)
+        value = value[len(match.group(0)):]
+        if name == "id":
+            # biopython stores it as the feature id, it is not a qualifier
+            return qualifier
+        qualifiers[name] = value[1:-1] if value.endswith('"') else value[1:]
+        return name
+    # continuation of the last qualifier
+    old_value = qualifiers[qualifier]
+    value = value.rstrip('"')
+    if qualifier == "evidence" or old_value.endswith("-"):
+        value = f"{old_value}{value}"
+    else:
+        value = f"{old_value} {value}"
+    if feature["type"] == "VAR_SEQ":
+        value = _clean_var_seq(value)
+    qualifiers[qualifier] = value
+    return qualifier
+
+
+def _clean_var_seq(description):
+    """remove the spaces added to VAR_SEQ sequences when they span several lines"""
+    try:
+        first_seq, second_seq = description.split(" -> ")
+    except ValueError:
+        return description
+    extra_info = ""
+    extra_info_pos = second_seq.find(" (")
+    if extra_info_pos != -1:
+        extra_info = second_seq[extra_info_pos:]
+        second_seq = second_seq[:extra_info_pos]
+    return first_seq.replace(" ", "") + " -> " + second_seq.replace(" ", "") + extra_info
+
+
+def record_from_swissprot(record):
+    """convert a biopython SwissProt record into a DatRecord"""
+    features = [
+        {
+            "location": [
+                f.location.start if not isinstance(f.location.start, UnknownPosition) else None,
+                f.location.end if not isinstance(f.location.end, UnknownPosition) else None,
+            ],
+            "type": f.type,
+            "qualifiers": f.qualifiers
+        }
+        for f in record.features]
+    return DatRecord(record.accessions, record.entry_name, record.data_class,
+                     int(record.taxonomy_id[0]), record.description, record.comments,
+                     record.keywords, features, record.sequence)
+
+
+def is_gzip(filename):
+    """return True if the file is gzip compressed"""
+    with open(filename, "rb") as dat_file:
+        return dat_file.read(2) == GZIP_MAGIC
+
+
+def is_bgzf(filename):
+    """return True if the file is block gzip compressed (e.g. with bgzip)"""
+    with open(filename, "rb") as dat_file:
+        header = dat_file.read(18)
+    return header[:4] == BGZF_MAGIC and header[12:14] == b"BC"
+
+
+def to_bgzf(filename, bgzf_filename):
+    """recompress a dat file with bgzf
+
+    loads from a bgzf file can be resumed by seeking to the checkpoint instead of
+    decompressing everything before it
+    """
+    opener = gzip.open if is_gzip(filename) else open
+    with opener(filename, "rb") as dat_file, bgzf.BgzfWriter(bgzf_filename, "wb") as out:
+        while chunk := dat_file.read(SKIP_CHUNK_SIZE):
+            out.write(chunk)
+
+
+class Checkpoint:
+    """Position of the last batch of records saved from a dat file
+
+    offset counts bytes of the decompressed stream, virtual_offset is only used for bgzf
+    files. the checkpoint is stored as json next to the dat file
+    """
+
+    def __init__(self, filename):
+        self.path = Path(f"{filename}.checkpoint")
+        self.offset = 0
+        self.virtual_offset = None
+        self.records = 0
+
+    def load(self):
+        """read the last saved position, if any"""
+        if self.path.exists():
+            info = json.loads(self.path.read_text())
+            self.offset = info["offset"]
+            self.virtual_offset = info["virtual_offset"]
+            self.records = info["records"]
+        return self
+
+    def save(self, offset, records, virtual_offset=None):
+        """save the position after a batch of records was committed"""
+        self.offset = offset
+        self.virtual_offset = virtual_offset
+        self.records += records
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({
+            "offset": self.offset,
+            "virtual_offset": self.virtual_offset,
+            "records": self.records,
+        }))
+        os.replace(tmp_path, self.path)
+
+
+class DatReader:
+    """Iterates over the DatRecords of a plain, gzip or bgzf dat file
+
+    keeps track of the byte offset of the end of the last record read, so that reading
+    can be resumed from there. plain and bgzf files are resumed with a seek. plain gzip
+    files cannot seek: resuming them decompresses (without parsing) everything up to the
+    offset, so it takes time proportional to the offset. convert them with to_bgzf first
+    when loads are expected to be resumed
+    """
+
+    def __init__(self, filename, offset=0, virtual_offset=None):
+        self.offset = offset
+        self.bgzf = is_bgzf(filename)
+        if self.bgzf:
+            self.handle = bgzf.BgzfReader(filename, "rb")
+            if virtual_offset is not None:
+                self.handle.seek(virtual_offset)
+        elif is_gzip(filename):
+            self.handle = gzip.open(filename, "rb")
+            if offset:
+                print(f"{filename} is not bgzf, decompressing {offset} bytes to resume")
+            remaining = offset
+            while remaining > 0:
+                remaining -= len(self.handle.read(min(remaining, SKIP_CHUNK_SIZE)))
+        else:
+            self.handle = open(filename, "rb")
+            self.handle.seek(offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.handle.close()
+
+    @property
+    def virtual_offset(self):
+        """bgzf virtual offset of the end of the last record read"""
+        return self.handle.tell() if self.bgzf else None
+
+    def __iter__(self):
+        return scan_records(_CountingLines(self))
+
+
+class _CountingLines:
+    """text lines of a DatReader handle, updating the reader offset"""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.reader.handle.readline()
+        if not line:
+            raise StopIteration
+        self.reader.offset += len(line)
+        return line.decode("ascii")
+
+
+def shard_offsets(filename, shard_size=SHARD_SIZE, start=0):
+    """split an uncompressed dat file into (start, end) byte ranges
+
+    every range starts at the beginning of a record and ends right after a // line
+    """
+    file_size = os.path.getsize(filename)
+    offsets = [start]
+    with open(filename, "rb") as dat_file:
+        position = start + shard_size
+        while position < file_size:
+            dat_file.seek(position)
+            # the first line is probably incomplete
+            dat_file.readline()
+            for line in dat_file:
+                if line == RECORD_END:
+                    break
+            position = dat_file.tell()
+            if position >= file_size:
+                break
+            offsets.append(position)
+            position += shard_size
+    offsets.append(file_size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def read_shard(filename, start, end):
+    """parse all the records in this byte range of the dat file"""
+    with open(filename, "rb") as dat_file:
+        dat_file.seek(start)
+        data = dat_file.read(end - start)
+    return list(scan_records(io.StringIO(data.decode("ascii"))))
+
+
+def parse_shards(filename, processes=None, shard_size=SHARD_SIZE, start=0):
+    """parse an uncompressed dat file in a process pool
+
+    yields (end offset, records) for each shard in file order, starting at the start byte
+    offset. only a couple of shards per process are parsed ahead of the consumer so memory
+    use stays bounded
+    """
+    if is_gzip(filename):
+        raise ValueError(f"{filename} is gzip compressed, sharding needs an uncompressed file")
+    processes = processes or os.cpu_count()
+    shards = shard_offsets(filename, shard_size, start=start)
+    print(f"Parsing {len(shards)} shards of {filename} with {processes} processes")
+    with Pool(processes) as pool:
+        pending = deque()
+        for start, end in shards:
+            pending.append((end, pool.apply_async(read_shard, (filename, start, end))))
+            if len(pending) >= 2 * processes:
+                end, result = pending.popleft()
+                yield end, result.get()
+        while pending:
+            end, result = pending.popleft()
+            yield end, result.get()
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniprot', '0018_sequence_idx_seq_len'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='checksum',
+            field=models.CharField(editable=False, max_length=32, null=True, verbose_name='checksum of the dat file record'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniprot', '0019_entry_checksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=31)),
+                ('start', models.IntegerField(null=True)),
+                ('end', models.IntegerField(null=True)),
+                ('note', models.TextField(blank=True)),
+                ('evidence', models.TextField(blank=True)),
+                ('ligand', models.TextField(blank=True)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sequence_features', to='uniprot.entry')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['type', 'start', 'end'], name='feature_type_position_idx'), models.Index(fields=['entry', 'type'], name='feature_entry_type_idx')],
+            },
+        ),
+    ]
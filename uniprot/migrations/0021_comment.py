@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniprot', '0020_feature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=63)),
+                ('text', models.TextField()),
+                ('ordinal', models.PositiveSmallIntegerField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='uniprot.entry')),
+            ],
+            options={
+                'ordering': ['entry', 'ordinal'],
+                'indexes': [models.Index(fields=['topic', 'entry'], name='comment_topic_entry_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='comment',
+            constraint=models.UniqueConstraint(fields=('entry', 'ordinal'), name='unique_comment_ordinal'),
+        ),
+    ]
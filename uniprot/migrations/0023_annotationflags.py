@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-18 03:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uniprot', '0022_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnotationFlags',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='flags', serialize=False, to='uniprot.entry')),
+                ('has_ec', models.BooleanField(default=False)),
+                ('has_enzyme_kw', models.BooleanField(default=False)),
+                ('has_catalytic_go', models.BooleanField(default=False)),
+                ('has_experimental_catalytic_go', models.BooleanField(default=False)),
+                ('inactive_name', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('has_ec', True)), fields=['entry'], name='flags_ec_idx'), models.Index(condition=models.Q(('has_enzyme_kw', True)), fields=['entry'], name='flags_kw_idx'), models.Index(condition=models.Q(('has_catalytic_go', True)), fields=['entry'], name='flags_go_idx'), models.Index(condition=models.Q(('has_experimental_catalytic_go', True)), fields=['entry'], name='flags_exp_go_idx'), models.Index(condition=models.Q(('inactive_name', True)), fields=['entry'], name='flags_inactive_idx')],
+            },
+        ),
+    ]
@@ -1,17 +1,26 @@
-import gzip
 from urllib.request import urlretrieve
 from itertools import islice
 import urllib.request
 import hashlib
+import json
+import ast
 
-from Bio import SeqIO, SwissProt
-from Bio.SeqFeature import UnknownPosition
+from Bio import SeqIO
 
-from django.db import models, transaction
-from django.db.models import Q, Count, Func, Index
-from django.db.models.functions import Length
+from collections import Counter
+
+from django.db import models, transaction, connection, connections
+from django.db.models import (Q, Count, Exists, ExpressionWrapper, Func, Index, OuterRef,
+                              Subquery)
+from django.db.models.functions import Greatest, Length
+from django.contrib.postgres.search import TrigramSimilarity
 import go.models as go
 import taxonomy.models as taxonomy
+from pseudoenzymes import bulk, search
+from uniprot import dat
+
+COMMENT_SEARCH_VECTOR = search.search_vector("text")
+INACTIVE_NAME_REGEX = r"^(probable |probably |putative )?inactive"
 
 class Sequence(models.Model):
     seq = models.TextField()
@@ -35,42 +44,98 @@ class EntryQuerySet(models.QuerySet):
         qs = self.annotate(seq_length=Length("seq__seq"))
         return qs.filter(seq_length__lte=max_length)
 
+    # the enzymes_* methods read the AnnotationFlags table, see AnnotationFlags.refresh.
+    # entries without a flags row are not catalytic
+
+    def _with_flag(self, flag, catalytic):
+        if catalytic:
+            return self.filter(**{f"flags__{flag}": True})
+        return self.exclude(**{f"flags__{flag}": True})
+
     def enzymes_ec(self, catalytic=True):
-        return self.filter(ec_entries__isnull=not(catalytic))
+        return self._with_flag("has_ec", catalytic)
 
     def enzymes_kw(self, catalytic=True):
-        enzymes = self.filter(keywords__in=Keyword.objects.enzymatic())
-        if catalytic:
-            return enzymes
-        else:
-            return self.exclude(ac__in=enzymes)
+        return self._with_flag("has_enzyme_kw", catalytic)
 
-    def enzymes_go(self, catalytic=True):
-        # enzymes = self.filter(go_associations__in=go.TermUniProtEntry.objects.catalytic())
+    def enzymes_go(self, catalytic=True, experimental=False):
+        if experimental:
+            return self._with_flag("has_experimental_catalytic_go", catalytic)
+        return self._with_flag("has_catalytic_go", catalytic)
 
-        catalytic_association = go.TermUniProtEntry.objects.filter(
-                term__in=go.Term.objects.catalytic(),
-                qualifier="enables"
-                )
-        enzymes = self.filter(go_associations__in=catalytic_association)
-        if catalytic:
-            return enzymes
-        else:
-            return self.exclude(ac__in=enzymes)
+    def with_comment(self, topic):
+        """return entries with a comment section of this topic (e.g. CAUTION)"""
+        return self.filter(ac__in=Comment.objects.filter(topic=topic).values("entry_id"))
 
     def catalytic_activity(self):
-        return self.filter(comment__contains="CATALYTIC ACTIVITY:")
+        return self.with_comment(Comment.CATALYTIC_ACTIVITY)
 
     def caution(self):
-        return self.filter(comment__contains="CAUTION:")
+        return self.with_comment(Comment.CAUTION)
 
     def inactive(self):
-        return self.filter(
-                Q(name__istartswith="inactive")|
-                Q(name__istartswith="probable inactive")|
-                Q(name__istartswith="probably inactive")|
-                Q(name__istartswith="putative inactive")
-                )
+        # a single regex can use the trigram index on name
+        return self.filter(name__iregex=INACTIVE_NAME_REGEX)
+
+    def search(self, text):
+        """entries with a name similar to text or comments matching it, best matches first
+
+        ranked by the highest of the name similarity and the text search rank of the best
+        matching comment
+        """
+        matches = self.model.objects.filter(name__trigram_similar=text).values("ac")\
+            .union(Comment.objects.search(text).order_by().values("entry_id"))
+        comment_rank = Comment.objects.search(text).filter(entry=OuterRef("ac"))\
+            .values("rank")[:1]
+        return self.filter(ac__in=matches)\
+                   .annotate(rank=Greatest(TrigramSimilarity("name", text),
+                                           Subquery(comment_rank)))\
+                   .order_by("-rank")
+
+    def with_feature(self, types, start=None, end=None):
+        """return entries with a feature of one of these types
+
+        with start and/or end, only features inside the [start, end) range are considered.
+        positions are python style, as in Entry.features
+        """
+        if isinstance(types, str):
+            types = [types]
+        features = Feature.objects.filter(type__in=types)
+        if start is not None:
+            features = features.filter(start__gte=start)
+        if end is not None:
+            features = features.filter(end__lte=end)
+        return self.filter(ac__in=features.values("entry_id"))
+
+    def in_taxa(self, taxa):
+        """return entries of species in the subtrees of these taxa (a Taxon queryset)
+
+        a range join on the nested set intervals of the taxonomy
+        """
+        return self.filter(Exists(taxa.filter(lft__lte=OuterRef("species__lft"),
+                                              rgt__gte=OuterRef("species__lft"))))
+
+    def count_by_rank(self, rank):
+        """number of entries per taxon of a rank column of taxonomy.Taxon (e.g. phylum)
+
+        a single GROUP BY on the denormalized rank column of the species, entries without a
+        taxon of that rank are counted under None
+        """
+        if rank not in taxonomy.Taxon.RANKS:
+            raise ValueError(f"rank must be one of {', '.join(taxonomy.Taxon.RANKS)}")
+        return self.values(f"species__{rank}", f"species__{rank}__name")\
+                   .annotate(count=Count("ac")).order_by("-count")
+
+    def with_go_terms(self, terms, *qualifiers):
+        """return entries annotated with any of these GO terms or their descendants
+
+        terms is a queryset of go.Term. only annotations with these qualifiers are used, if
+        given. uses the propagated annotations (go.PropagatedAnnotation)
+        """
+        annotations = go.PropagatedAnnotation.objects.filter(term__in=terms)
+        if qualifiers:
+            annotations = annotations.with_qualifier(*qualifiers)
+        return self.filter(ac__in=annotations.values("uniprot_entry_id"))
 
     def single_domain(self):
         """return uniprot entries that are associated with a single CATH superfamily"""
@@ -99,113 +164,334 @@ class Entry(models.Model):
             on_delete=models.SET_NULL
     )
     features = models.JSONField()
+    checksum = models.CharField(
+            max_length=32,
+            null=True,
+            editable=False,
+            verbose_name="checksum of the dat file record",
+    )
 
     objects = EntryQuerySet.as_manager()
 
     class Meta:
         indexes = [
             Index(fields=["reviewed"], condition=Q(reviewed=True), name="reviewed_idx"),
+            search.trigram_index("name", "entry_name_trgm_idx"),
         ]
 
     def __str__(self):
         return self.ac
     
     @classmethod
-    def create_from_dat_file(cls, filename, skip_first=0):
-        """Create all UniProt entries from a uniprot dat_gz file does not update old entries"""
+    def dat_sinks(cls):
+        """sinks that create the UniProt entries and the tables that are part of this app"""
+        return [SequenceSink(), EntrySink(), KeywordSink(), FeatureSink(), CommentSink()]
+
+    @classmethod
+    def create_from_dat_file(cls, filename, skip_first=0, resume=False, sinks=None,
+                             checkpoint=True, diff=True, retire=False):
+        """Read a uniprot dat file once and send every batch of records to the sinks
+
+        by default creates and updates all UniProt entries. other apps add their own sinks
+        to fill tables derived from the same file in the same pass.
+
+        with diff only new records and records that changed since they were loaded are
+        written (see ReleaseDiff). without diff every record is written again, the sinks
+        replace or merge the rows of the entries already in the database. retire also
+        deletes the entries of the same data class (reviewed or not) that are missing from
+        the file, use it when loading a new release.
+
+        a checkpoint is saved after each batch, with resume=True reading starts right
+        after the last saved batch instead of at the beginning of the file
+        """
         batch_size = 100000
 
-        taxid_map = taxonomy.Taxon.objects.all().old_to_new()
-        with gzip.open(filename, "rb") as dat_file:
+        sinks = cls.dat_sinks() if sinks is None else sinks
+        release = ReleaseDiff() if diff else None
+        checkpoint = dat.Checkpoint(filename) if checkpoint else None
+        if resume and checkpoint:
+            checkpoint.load()
+            print(f"Resuming after {checkpoint.records} records")
+        offset = checkpoint.offset if checkpoint else 0
+        virtual_offset = checkpoint.virtual_offset if checkpoint else None
+        with dat.DatReader(filename, offset, virtual_offset) as reader:
             records = []
-            for no, record in enumerate(islice(SwissProt.parse(dat_file), skip_first, None)):
-                if no > 0 and (no % batch_size) == 0:
-                    cls.create_from_records(records, taxid_map)
-                    records = []
+            for record in islice(reader, skip_first, None):
+                # the reader offset is right after the last record of the batch
                 records.append(record)
-            cls.create_from_records(records, taxid_map)
+                if len(records) == batch_size:
+                    cls.create_from_records(records, sinks, release)
+                    if checkpoint:
+                        checkpoint.save(reader.offset, len(records), reader.virtual_offset)
+                    records = []
+            cls.create_from_records(records, sinks, release)
+            if checkpoint:
+                checkpoint.save(reader.offset, len(records), reader.virtual_offset)
+        for sink in sinks:
+            sink.close()
+        if release:
+            release.finish(retire, complete=offset == 0 and skip_first == 0)
+        AnnotationFlags.refresh()
+
+    @classmethod
+    def create_from_dat_shards(cls, filename, processes=None, resume=False, sinks=None,
+                               diff=True, retire=False):
+        """Same as create_from_dat_file for an uncompressed dat file, using a process pool
+
+        the file is split into shards at record boundaries, parsed in parallel, and the
+        records are written in batches by this process. uses the same checkpoints as
+        create_from_dat_file
+        """
+        batch_size = 100000
+
+        sinks = cls.dat_sinks() if sinks is None else sinks
+        checkpoint = dat.Checkpoint(filename)
+        if resume:
+            checkpoint.load()
+            print(f"Resuming after {checkpoint.records} records")
+        start = checkpoint.offset
+        # forked workers must not share the database connection, so the connection is only
+        # opened again (by ReleaseDiff or the first batch) once the pool is running
+        connections.close_all()
+        release = None
+        records = []
+        end = start
+        for end, shard_records in dat.parse_shards(filename, processes=processes, start=start):
+            if diff and release is None:
+                release = ReleaseDiff()
+            records.extend(shard_records)
+            if len(records) >= batch_size:
+                cls.create_from_records(records, sinks, release)
+                checkpoint.save(end, len(records))
+                records = []
+        if diff and release is None:
+            release = ReleaseDiff()
+        cls.create_from_records(records, sinks, release)
+        checkpoint.save(end, len(records))
+        for sink in sinks:
+            sink.close()
+        if release:
+            release.finish(retire, complete=start == 0)
+        AnnotationFlags.refresh()
 
     @classmethod
     @transaction.atomic
-    def create_from_records(cls, records,taxid_map):
-        "create UniProt objects biopython record objects"
-        print(f"Creating entries from {len(records)} records")
-
-        # checking for existing objects is done inside the function to save memory
-        # skipping existing entries
-        ac2rec = {rec.accessions[0]: rec for rec in records}
-        existing_acs = set(cls.objects.filter(ac__in=ac2rec).values_list("ac", flat=True))
-        records = [rec for ac, rec in ac2rec.items() if ac not in existing_acs]
-        print(f"Records not in db: {len(records)}")
-   
-        # adding missing sequence objects
-        hex2rec = {get_seq_hash(rec.sequence): rec for rec in records}
-        hex2id = {t[0]: t[1] for t in Sequence.objects.filter(seq_hash__in=hex2rec)\
-            .values_list("seq_hash","id")}
-        seq_created = Sequence.objects.bulk_create(
-                [Sequence(seq=rec.sequence, seq_hash=seq_hash) for seq_hash, rec in
-                 hex2rec.items() if seq_hash not in hex2id],
-                batch_size=10000
-        )
-        hex2id.update({ seq.seq_hash: seq.pk for seq in seq_created})
-        print(f"{len(seq_created)} new sequence objects created")
+    def create_from_records(cls, records, sinks, release=None):
+        """write a batch of dat.DatRecord objects with every sink in a single transaction
+
+        with a ReleaseDiff only new and changed records are written, the rows derived from
+        the changed ones are deleted by the sinks first
+        """
+        if release is not None:
+            records, changed_acs = release.compare(records)
+            for sink in sinks:
+                sink.delete(changed_acs)
+        print(f"Writing {len(records)} records")
+        for sink in sinks:
+            sink.write(records)
+        print(f"Done writing {len(records)} records and related annotations")
+
+    def comments_of_topic(self, topic):
+        """comment sections of this topic, uses prefetch_related("comments") if available"""
+        return [str(comment) for comment in self.comments.all() if comment.topic == topic]
 
-        # now adding the uniprot entries
-        to_create = []
-        kw_recs = set()
-        entry_keywords = []
-        print("looping over records")
-        for record in records:
-            ac = record.accessions[0]
-            keywords = clean_kws_from_record(record)
-            kw_recs.update(keywords)
+    @property
+    def catalytic_activities(self):
+        return self.comments_of_topic(Comment.CATALYTIC_ACTIVITY)
 
-            # prepare keyword through objects
-            for kw in keywords:
-                entry_keywords.append(cls.keywords.through(entry_id=ac, keyword_id=kw))
-            
-            features = [
-                    {
-                        "location": [
-                            f.location.start if not isinstance(f.location.start, UnknownPosition) else None, 
-                            f.location.end if not isinstance(f.location.end, UnknownPosition) else None, 
-                            ],
-                        "type": f.type,
-                        "qualifiers": f.qualifiers
-                    }
-                    for f in record.features]
-
-            obj = cls(
-                ac=ac,
-                name=record.entry_name,
-                seq_id=hex2id[get_seq_hash(record.sequence)],
-                species_id=taxid_map.get(int(record.taxonomy_id[0]), None),
-                secondary_ac=record.accessions[1:],
-                comment=record.comments,
-                features=features,
-                reviewed=record.data_class=="Reviewed",
-            )
-            to_create.append(obj)
+    @property
+    def cautions(self):
+        return self.comments_of_topic(Comment.CAUTION)
 
-        print(f"Creating {len(to_create)} new UniProt entries")
-        cls.objects.bulk_create(to_create, batch_size=5000)
 
-        # Add new keywords
-        db_kws = set(Keyword.objects.filter(name__in=kw_recs).values_list("name", flat=True))
-        Keyword.objects.bulk_create([Keyword(name=kw) for kw in kw_recs if kw not in db_kws])
+class AnnotationFlags(models.Model):
+    """Enzyme annotation flags of a UniProt entry
 
-        print(f"Creating {len(entry_keywords)} new UniProt - Keywords relations")
-        cls.keywords.through.objects.bulk_create(entry_keywords, batch_size=10000)
-        print(f"Done creating {len(to_create)} records and related annotations")
+    materialized from the EC, keyword and GO annotations so that they can be filtered
+    without joins. refreshed at the end of the UniProt, EC and GO loads
+    """
+    entry = models.OneToOneField(
+            "Entry",
+            primary_key=True,
+            related_name="flags",
+            on_delete=models.CASCADE
+    )
+    has_ec = models.BooleanField(default=False)
+    has_enzyme_kw = models.BooleanField(default=False)
+    has_catalytic_go = models.BooleanField(default=False)
+    has_experimental_catalytic_go = models.BooleanField(default=False)
+    inactive_name = models.BooleanField(default=False)
 
+    FLAGS = ["has_ec", "has_enzyme_kw", "has_catalytic_go", "has_experimental_catalytic_go",
+             "inactive_name"]
 
-    @property
-    def catalytic_activities(self):
-        return [line for line in self.comment.split("\n") if line.startswith("CATALYTIC ACTIVITY:")]
+    class Meta:
+        indexes = [
+            Index(fields=["entry"], condition=Q(has_ec=True), name="flags_ec_idx"),
+            Index(fields=["entry"], condition=Q(has_enzyme_kw=True), name="flags_kw_idx"),
+            Index(fields=["entry"], condition=Q(has_catalytic_go=True), name="flags_go_idx"),
+            Index(fields=["entry"], condition=Q(has_experimental_catalytic_go=True),
+                  name="flags_exp_go_idx"),
+            Index(fields=["entry"], condition=Q(inactive_name=True), name="flags_inactive_idx"),
+        ]
+
+    @classmethod
+    @transaction.atomic
+    def refresh(cls):
+        """recompute the flags of all the entries with a single INSERT ... SELECT"""
+        catalytic_go = go.TermUniProtEntry.objects.catalytic()\
+                .filter(uniprot_entry=OuterRef("ac"))
+        flags = Entry.objects.annotate(
+            has_ec=Exists(Entry.ec_entries.through.objects.filter(uniprot_entry=OuterRef("ac"))),
+            has_enzyme_kw=Exists(Entry.keywords.through.objects.filter(
+                entry=OuterRef("ac"),
+                keyword__in=Keyword.objects.enzymatic())),
+            has_catalytic_go=Exists(catalytic_go),
+            has_experimental_catalytic_go=Exists(catalytic_go.experimental()),
+            inactive_name=ExpressionWrapper(Q(name__iregex=INACTIVE_NAME_REGEX),
+                                            output_field=models.BooleanField()),
+        ).values_list("ac", *cls.FLAGS)
+        sql, params = flags.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {cls._meta.db_table};")
+            cursor.execute(f"INSERT INTO {cls._meta.db_table} (entry_id, {', '.join(cls.FLAGS)}) "
+                           f"{sql};", params)
+            print(f"Refreshed the annotation flags of {cursor.rowcount} entries")
+
+
+class CommentQuerySet(models.QuerySet):
+
+    def search(self, text):
+        """comments matching text, best matches first"""
+        return search.text_search(self, COMMENT_SEARCH_VECTOR, text)
+
+
+class Comment(models.Model):
+    """Section of the comments (CC lines) of a UniProt entry
+
+    the topic is the text before the colon (e.g. CATALYTIC ACTIVITY), empty if there is none.
+    ordinal is the position of the section within the entry comments
+    """
+    CATALYTIC_ACTIVITY = "CATALYTIC ACTIVITY"
+    CAUTION = "CAUTION"
+
+    entry = models.ForeignKey(
+            "Entry",
+            related_name="comments",
+            on_delete=models.CASCADE
+    )
+    topic = models.CharField(max_length=63)
+    text = models.TextField()
+    ordinal = models.PositiveSmallIntegerField()
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["entry", "ordinal"]
+        constraints = [
+            models.UniqueConstraint(fields=["entry", "ordinal"], name="unique_comment_ordinal"),
+        ]
+        indexes = [
+            Index(fields=["topic", "entry"], name="comment_topic_entry_idx"),
+            search.vector_index(COMMENT_SEARCH_VECTOR, "comment_text_search_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic}: {self.text}" if self.topic else self.text
+
+    @staticmethod
+    def split_topic(comment):
+        """(topic, text) of a comment as read from the dat file"""
+        topic, sep, text = comment.partition(":")
+        if not sep or not topic.isupper():
+            return "", comment
+        return topic, text.strip()
+
+    @classmethod
+    def rows_from_comments(cls, ac, comments):
+        """table rows for a list of comments of an entry"""
+        return [(ac, *cls.split_topic(comment), ordinal)
+                for ordinal, comment in enumerate(comments)]
+
+    @classmethod
+    @transaction.atomic
+    def create_from_entries(cls, batch_size=100000):
+        """Fill the table from the comment text of the entries already in the database
+
+        entries are read and copied one batch at a time, no query can run on the connection
+        while a COPY is in progress
+        """
+        created = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {cls._meta.db_table};")
+            last_ac = ""
+            while True:
+                entries = list(Entry.objects.filter(ac__gt=last_ac).order_by("ac")
+                               .values_list("ac", "comment")[:batch_size])
+                if not entries:
+                    break
+                last_ac = entries[-1][0]
+                rows = [row for ac, comment in entries
+                        for row in cls.rows_from_comments(ac, ast.literal_eval(comment or "[]"))]
+                created += bulk.copy_rows(cls._meta.db_table,
+                                          ["entry_id", "topic", "text", "ordinal"],
+                                          rows, cursor=cursor)
+        print(f"Created {created} comments")
+
+class Feature(models.Model):
+    """Sequence feature of a UniProt entry (FT lines) with its main qualifiers
+
+    same information as Entry.features, in a table that can be filtered and indexed.
+    positions are python style (start is 0-based, end is exclusive), null when unknown
+    """
+    entry = models.ForeignKey(
+            "Entry",
+            related_name="sequence_features",
+            on_delete=models.CASCADE
+    )
+    type = models.CharField(max_length=31)
+    start = models.IntegerField(null=True)
+    end = models.IntegerField(null=True)
+    note = models.TextField(blank=True)
+    evidence = models.TextField(blank=True)
+    ligand = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            Index(fields=["type", "start", "end"], name="feature_type_position_idx"),
+            Index(fields=["entry", "type"], name="feature_entry_type_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_id} {self.type} {self.start}..{self.end}"
+
+    @staticmethod
+    def rows_from_record(record):
+        """table rows for the features of a dat.DatRecord"""
+        ac = record.accessions[0]
+        return [(ac, f["type"], f["location"][0], f["location"][1],
+                 f["qualifiers"].get("note", ""),
+                 f["qualifiers"].get("evidence", ""),
+                 f["qualifiers"].get("ligand", ""))
+                for f in record.features]
+
+    @classmethod
+    @transaction.atomic
+    def create_from_entries(cls):
+        """Fill the table from the features json of the entries already in the database"""
+        cls.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {cls._meta.db_table}
+                    (entry_id, type, start, "end", note, evidence, ligand)
+                SELECT e.ac, f->>'type', (f->'location'->>0)::int, (f->'location'->>1)::int,
+                       coalesce(f->'qualifiers'->>'note', ''),
+                       coalesce(f->'qualifiers'->>'evidence', ''),
+                       coalesce(f->'qualifiers'->>'ligand', '')
+                FROM {Entry._meta.db_table} e
+                CROSS JOIN LATERAL jsonb_array_elements(e.features) f;""")
+            print(f"Created {cursor.rowcount} features")
 
-    @property
-    def cautions(self):
-        return [line for line in self.comment.split("\n") if line.startswith("CAUTION:")]
 
 class KeywordQuerySet(models.QuerySet):
 
@@ -249,6 +535,168 @@ class MultiSequenceAlignment(models.Model):
         unique_together = ['name', 'family', 'seq']
 
 
+class ReleaseDiff:
+    """Compares the records of a UniProt release with the entries in the database
+
+    records are fingerprinted with dat.record_checksum, which is stored in Entry.checksum.
+    the accessions in the release are kept in a temporary table so that the entries
+    missing from it can be retired at the end
+    """
+    release_table = "uniprot_release_ac"
+
+    def __init__(self):
+        self.counts = Counter()
+        self.data_classes = set()
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {self.release_table} "
+                           f"(ac varchar(10) NOT NULL);")
+            cursor.execute(f"TRUNCATE {self.release_table};")
+
+    def compare(self, records):
+        """return the new and changed records, and the accessions of the changed ones"""
+        checksums = {rec.accessions[0]: dat.record_checksum(rec) for rec in records}
+        existing = dict(Entry.objects.filter(ac__in=checksums).values_list("ac", "checksum"))
+        changed = {ac for ac, checksum in existing.items() if checksum != checksums[ac]}
+        bulk.copy_rows(self.release_table, ["ac"], ((ac,) for ac in checksums))
+        self.data_classes.update(rec.data_class for rec in records)
+
+        self.counts["new"] += len(checksums) - len(existing)
+        self.counts["changed"] += len(changed)
+        self.counts["unchanged"] += len(existing) - len(changed)
+        return [rec for rec in records if rec.accessions[0] not in existing
+                or rec.accessions[0] in changed], changed
+
+    def retire(self):
+        """delete the entries of the release data classes that are not in the release"""
+        batch_size = 10000
+        missing = Entry.objects\
+            .filter(reviewed__in={data_class == "Reviewed" for data_class in self.data_classes})\
+            .extra(where=[f"NOT EXISTS (SELECT 1 FROM {self.release_table} r "
+                          f"WHERE r.ac = uniprot_entry.ac)"])
+        acs = list(missing.values_list("ac", flat=True))
+        for start in range(0, len(acs), batch_size):
+            with transaction.atomic():
+                Entry.objects.filter(ac__in=acs[start:start + batch_size]).delete()
+        self.counts["retired"] += len(acs)
+
+    def finish(self, retire, complete):
+        """retire the missing entries if asked to and print what changed"""
+        if retire and complete:
+            self.retire()
+        elif retire:
+            print("Not retiring entries, the release was not read from the beginning")
+        print(", ".join(f"{count} {name}" for name, count in self.counts.items()))
+
+
+class SequenceSink(dat.Sink):
+    """Creates the missing Sequence objects of dat records"""
+
+    def write(self, records):
+        hex2seq = {get_seq_hash(rec.sequence): rec.sequence for rec in records}
+        seq_created = bulk.copy_merge(
+                Sequence._meta.db_table,
+                ["seq", "seq_hash"],
+                ((seq, seq_hash) for seq_hash, seq in hex2seq.items())
+        )
+        print(f"{seq_created} new sequence objects created")
+
+
+class EntrySink(dat.Sink):
+    """Creates the UniProt entries of dat records, existing entries are updated
+
+    must come after the SequenceSink
+    """
+
+    def __init__(self):
+        self.taxid_map = taxonomy.Taxon.objects.all().old_to_new()
+
+    def write(self, records):
+        hex2id = {t[0]: t[1] for t in Sequence.objects\
+            .filter(seq_hash__in={get_seq_hash(rec.sequence) for rec in records})\
+            .values_list("seq_hash","id")}
+        to_create = []
+        for record in records:
+            # same column values the ORM would write, json fields are serialized here
+            to_create.append((
+                record.accessions[0],
+                record.entry_name,
+                hex2id[get_seq_hash(record.sequence)],
+                self.taxid_map.get(record.taxid, None),
+                json.dumps(record.accessions[1:]),
+                str(record.comments),
+                json.dumps(record.features),
+                record.data_class=="Reviewed",
+                dat.record_checksum(record),
+            ))
+
+        merged = bulk.copy_merge(
+                Entry._meta.db_table,
+                ["ac", "name", "seq_id", "species_id", "secondary_ac", "comment", "features",
+                 "reviewed", "checksum"],
+                to_create,
+                update_conflicts=True,
+                unique_fields=["ac"],
+        )
+        print(f"Created or updated {merged} UniProt entries")
+
+
+class KeywordSink(dat.Sink):
+    """Creates the keywords of dat records and links them to the UniProt entries
+
+    the links of the entries are replaced, so keywords removed from a record are unlinked
+    """
+
+    def write(self, records):
+        self.delete([rec.accessions[0] for rec in records])
+        kw_recs = set()
+        entry_keywords = []
+        for record in records:
+            keywords = clean_kws_from_record(record)
+            kw_recs.update(keywords)
+            for kw in keywords:
+                entry_keywords.append((record.accessions[0], kw))
+
+        # Add new keywords
+        db_kws = set(Keyword.objects.filter(name__in=kw_recs).values_list("name", flat=True))
+        Keyword.objects.bulk_create([Keyword(name=kw) for kw in kw_recs if kw not in db_kws])
+
+        created = bulk.copy_merge(Entry.keywords.through._meta.db_table,
+                                  ["entry_id", "keyword_id"], entry_keywords)
+        print(f"Created {created} new UniProt - Keywords relations")
+
+    def delete(self, acs):
+        Entry.keywords.through.objects.filter(entry_id__in=acs).delete()
+
+
+class FeatureSink(dat.Sink):
+    """Creates the Feature rows of dat records, replacing the existing ones"""
+
+    def write(self, records):
+        Feature.objects.filter(entry_id__in=[rec.accessions[0] for rec in records]).delete()
+        rows = [row for record in records for row in Feature.rows_from_record(record)]
+        bulk.copy_rows(Feature._meta.db_table,
+                       ["entry_id", "type", "start", '"end"', "note", "evidence", "ligand"],
+                       rows)
+        print(f"Created {len(rows)} features")
+
+    def delete(self, acs):
+        Feature.objects.filter(entry_id__in=acs).delete()
+
+
+class CommentSink(dat.Sink):
+    """Creates the Comment rows of dat records, replacing the existing ones"""
+
+    def write(self, records):
+        Comment.objects.filter(entry_id__in=[rec.accessions[0] for rec in records]).delete()
+        rows = [row for record in records
+                for row in Comment.rows_from_comments(record.accessions[0], record.comments)]
+        bulk.copy_rows(Comment._meta.db_table, ["entry_id", "topic", "text", "ordinal"], rows)
+        print(f"Created {len(rows)} comments")
+
+    def delete(self, acs):
+        Comment.objects.filter(entry_id__in=acs).delete()
+
+
 def clean_kws_from_record(record):
     """get clean keywords from sequence record object
     